@@ -0,0 +1,203 @@
+"""
+本地 Telegram Bot API 替身，用于测试与压测 telegram 适配器
+getUpdates 支持长轮询，按配置合成群消息，并可为发送类接口注入延迟。
+群的 chat_id 为 -1..-N，成员为 10001..10000+M
+
+    python -m bench.fakebotapi [--port 8081] [--groups 10] [--members 50]
+                               [--rate 100] [--commands '/google yoz=0.1']
+                               [--latency 20] [--duration 60] [--app]
+
+指定 --app 时在同一进程中运行真实的 Telegram 适配器（API_URL 指向替身）并输出回复延迟
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+
+from aiohttp import web
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from bench.stubserver import parseCommands, percentile
+from util import codec
+
+
+TOKEN = '123456:FAKE'
+SEND_METHODS = ('sendMessage', 'sendPhoto')
+
+
+class FakeBotApi:
+
+    def __init__(self, groups: int = 10, members: int = 50, rate: float = 100,
+                 commands: List[Tuple[str, float]] = None, latency: float = 0.0,
+                 chatter: List[str] = None) -> None:
+        self.groups: int = groups
+        self.members: int = members
+        self.rate: float = rate
+        self.commands: List[Tuple[str, float]] = commands or []
+        self.latency: float = latency
+        self.chatter: List[str] = chatter or ['早', '哈哈哈', '在吗', '+1']
+
+        self.emitted: int = 0
+        self.commandsEmitted: int = 0
+        self.batches: List[int] = []
+        self.calls: Dict[str, int] = {}
+        self.replyLatencies: List[float] = []
+        self.started: float = None
+        self.__updates: Deque[dict] = deque()
+        self.__arrived: asyncio.Event = None
+        self.__pending: Dict[int, Deque[float]] = {}
+        self.__updateIds = itertools.count(1)
+        self.__messageIds = itertools.count(1)
+
+        self.app = web.Application()
+        self.app.router.add_post('/bot{token}/{method}', self.__endpoint)
+        self.__runner: web.AppRunner = None
+        self.__producer: asyncio.Task = None
+
+    async def start(self, host: str = 'localhost', port: int = 8081) -> None:
+        self.__arrived = asyncio.Event()
+        self.__runner = web.AppRunner(self.app)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host, port).start()
+
+    async def stop(self) -> None:
+        if self.__producer is not None:
+            self.__producer.cancel()
+        await self.__runner.cleanup()
+
+    def push(self, message: dict) -> None:
+        """加入一条 message 更新，测试中可直接调用"""
+        self.__updates.append({'update_id': next(self.__updateIds), 'message': message})
+        self.__arrived.set()
+
+    async def __endpoint(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        body = await request.text()
+        payload = codec.loads(body) if body else {}
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == 'getMe':
+            result = {'id': int(TOKEN.split(':')[0]), 'is_bot': True,
+                      'first_name': 'yoz', 'username': 'yozbot'}
+        elif method == 'getUpdates':
+            result = await self.__getUpdates(payload)
+        elif method == 'getChatAdministrators':
+            # 机器人为各群管理员
+            result = [{'user': {'id': int(TOKEN.split(':')[0]), 'is_bot': True},
+                       'status': 'administrator'}]
+        elif method in SEND_METHODS:
+            if self.latency > 0:
+                await asyncio.sleep(self.latency)
+            pending = self.__pending.get(payload.get('chat_id'))
+            if pending:
+                self.replyLatencies.append(time.monotonic() - pending.popleft())
+            result = {'message_id': next(self.__messageIds),
+                      'chat': {'id': payload.get('chat_id')}, 'date': int(time.time())}
+        else:
+            result = True
+        return web.Response(text=codec.dumps({'ok': True, 'result': result}),
+                            content_type='application/json')
+
+    async def __getUpdates(self, payload: dict) -> List[dict]:
+        offset = payload.get('offset', 0)
+        while self.__updates and self.__updates[0]['update_id'] < offset:
+            self.__updates.popleft()
+        if not self.__updates and payload.get('timeout', 0) > 0:
+            self.__arrived.clear()
+            if self.__producer is None and self.rate > 0:
+                self.__producer = asyncio.ensure_future(self.__produce())
+            try:
+                await asyncio.wait_for(self.__arrived.wait(), payload['timeout'])
+            except asyncio.TimeoutError:
+                pass
+        batch = list(itertools.islice(self.__updates, payload.get('limit', 100)))
+        if batch:
+            self.batches.append(len(batch))
+        return batch
+
+    async def __produce(self) -> None:
+        self.started = time.monotonic()
+        for i in itertools.count():
+            delay = self.started + i / self.rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            chatId = -random.randint(1, self.groups)
+            userId = 10000 + random.randint(1, self.members)
+            roll = random.random()
+            text = random.choice(self.chatter)
+            for command, weight in self.commands:
+                if roll < weight:
+                    text = command
+                    self.__pending.setdefault(chatId, deque()).append(time.monotonic())
+                    self.commandsEmitted += 1
+                    break
+                roll -= weight
+            self.push({
+                'message_id': next(self.__messageIds),
+                'date': int(time.time()),
+                'from': {'id': userId, 'is_bot': False, 'first_name': f'成员{userId}'},
+                'chat': {'id': chatId, 'type': 'group', 'title': f'群{-chatId}'},
+                'text': text
+            })
+            self.emitted += 1
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.started if self.started is not None else 0
+        lines = [
+            f'已发出更新 {self.emitted}（指令 {self.commandsEmitted}）  用时 {elapsed:.1f}s  '
+            f'{self.emitted / elapsed if elapsed > 0 else 0:.1f} 更新/秒',
+            f'getUpdates 批次 {len(self.batches)}  平均每批 '
+            f'{sum(self.batches) / len(self.batches) if self.batches else 0:.1f} 条',
+            f'收到回复 {len(self.replyLatencies)}  回复延迟 ' + '  '.join(
+                f'{name} {percentile(self.replyLatencies, p) * 1000:.1f}ms'
+                for name, p in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))),
+            '接口调用 ' + ('  '.join(f'{api} {cnt}' for api, cnt in sorted(self.calls.items())) or '无')
+        ]
+        return '\n'.join(lines)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = FakeBotApi(args.groups, args.members, args.rate,
+                        parseCommands(args.commands), args.latency / 1000)
+    await server.start(args.host, args.port)
+    print(f'Bot API 替身已启动于 {args.host}:{args.port}，令牌 {TOKEN}')
+    poller = None
+    if args.app:
+        import telegram.settings as s
+        s.API_URL = f'http://{args.host}:{args.port}'
+        s.BOT_TOKEN = TOKEN
+        s.POLL_TIMEOUT = 1
+        from telegram.application import Telegram
+
+        app = Telegram()
+        await app._init_modules()
+        poller = asyncio.ensure_future(app._start())
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        if poller is not None:
+            poller.cancel()
+            await app.http.close()
+            await app.poller.close()
+        print(server.report())
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 Telegram Bot API 替身')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--groups', type=int, default=10, help='群数量')
+    parser.add_argument('--members', type=int, default=50, help='每群成员数量')
+    parser.add_argument('--rate', type=float, default=100, help='每秒合成的消息数')
+    parser.add_argument('--commands', default='/google yoz=0.1',
+                        help='指令及其占比，如 "/google yoz=0.1,/种树=0.01"')
+    parser.add_argument('--latency', type=float, default=0.0, help='发送类接口注入的延迟（毫秒）')
+    parser.add_argument('--duration', type=float, default=60, help='运行时长（秒）')
+    parser.add_argument('--app', action='store_true', help='同时运行 Telegram 适配器')
+    asyncio.get_event_loop().run_until_complete(serve(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
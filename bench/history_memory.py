@@ -0,0 +1,91 @@
+"""
+消息历史的内存占用基准
+读取录制的事件流，构造事件并取出发送者、群与消息，全部保存在内存中，
+统计每条历史记录净占用的内存块数与字节数。不指定录制文件时合成一段群消息
+
+    python -m bench.history_memory [录制文件] [--events 条数]
+"""
+import argparse
+import random
+import tracemalloc
+
+from typing import Iterator, List, Tuple
+
+from mirai.mapping import Mirai2CoreEvents
+from mirai.record import readRecording
+from mirai.unify import unifyEventDict
+from util import codec
+
+
+def synthesize(count: int, groups: int = 10, members: int = 50) -> Iterator[dict]:
+    """与 bench.stubserver 相同规模的群消息，部分带 At 与图片"""
+    rand = random.Random(0)
+    for i in range(count):
+        groupId = rand.randint(1, groups)
+        memberId = 10000 + rand.randint(1, members)
+        chain = [{'type': 'Source', 'id': i, 'time': 1600000000 + i}]
+        roll = rand.random()
+        if roll < 0.2:
+            chain.append({'type': 'At', 'target': 10000 + rand.randint(1, members),
+                          'display': '@群友'})
+        chain.append({'type': 'Plain', 'text': rand.choice(['早', '哈哈哈', '在吗', '+1'])})
+        if roll > 0.9:
+            chain.append({'type': 'Image', 'imageId': f'{{{i:08X}-70ED-EAE3-B37C-101F1EEBF5B5}}.jpg',
+                          'url': 'https://example.com/image.jpg', 'path': None})
+        yield {
+            'type': 'GroupMessage',
+            'messageChain': chain,
+            'sender': {
+                'id': memberId,
+                'memberName': f'成员{memberId}',
+                'permission': 'MEMBER',
+                'group': {'id': groupId, 'name': f'群{groupId}', 'permission': 'ADMINISTRATOR'}
+            }
+        }
+
+
+def recorded(path: str, count: int) -> Iterator[dict]:
+    events = {e.name for e in Mirai2CoreEvents}
+    for _, frame in readRecording(path):
+        response = codec.loads(frame).get('data', {})
+        if response.get('type') in events:
+            yield response
+            count -= 1
+            if count == 0:
+                return
+
+
+def materialize(response: dict) -> Tuple:
+    """历史中保存的是处理函数实际会读取的对象"""
+    e = Mirai2CoreEvents[response['type']].value(response)
+    return e.sender, getattr(e, 'group', None), e.msg
+
+
+def main():
+    parser = argparse.ArgumentParser(description='消息历史内存占用基准')
+    parser.add_argument('path', nargs='?', help='录制文件，缺省时合成事件')
+    parser.add_argument('--events', type=int, default=20000, help='最多读取的事件数')
+    args = parser.parse_args()
+
+    if args.path is None:
+        responses = [unifyEventDict(r) for r in synthesize(args.events)]
+    else:
+        responses = [unifyEventDict(r) for r in recorded(args.path, args.events)]
+    # 原始字典不计入，只统计构造出的对象
+    history: List[Tuple] = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for response in responses:
+        history.append(materialize(response))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    count = max(len(history), 1)
+    print(f'事件 {len(history)}  共 {size / 1024:.1f} KiB  '
+          f'{blocks / count:.1f} 块/条  {size / count:.1f} 字节/条')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+端到端压测：在同一进程中启动 mirai 替身（bench/stubserver.py）与真实的 Mirai 适配器，
+运行指定时长后输出事件吞吐与回复延迟分位数
+只有在模块配置中启用的群（群号 1..N）才会产生回复
+
+    python -m bench.loadtest [--groups 10] [--rate 200] [--commands '.google yoz=0.2']
+                             [--latency 20] [--duration 30] [--workers 4]
+
+分片运行（--workers 大于 1）前需在 config/modules.yml 的 modules 中去掉 forest 等
+在进程内保存状态的模块，否则 ShardReader 拒绝启动
+"""
+import argparse
+import asyncio
+
+import mirai.settings as s
+
+from bench.stubserver import addArguments, fromArguments
+
+
+async def loadtest(args: argparse.Namespace) -> None:
+    s.HOST = args.host
+    s.PORT = args.port
+    s.WS_URL = f'ws://{args.host}:{args.port}'
+    s.HTTP_URL = f'http://{args.host}:{args.port}'
+
+    # 替身地址需在构造 Mirai 前设置好
+    from mirai.application import Mirai
+    from mirai.shard import ShardReader
+
+    server = fromArguments(args)
+    await server.start(args.host, args.port)
+    if args.workers > 1:
+        app = ShardReader(args.workers)
+        app.start(asyncio.get_event_loop())
+    else:
+        app = Mirai()
+        await app._init_modules()
+    reader = asyncio.ensure_future(app._message_event_socket())
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        reader.cancel()
+        print(server.report())
+        await server.stop()
+        await app.http.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mirai 适配器端到端压测')
+    addArguments(parser)
+    parser.add_argument('--workers', type=int, default=0, help='工作进程数，大于 1 时分片运行')
+    parser.set_defaults(duration=30)
+    asyncio.get_event_loop().run_until_complete(loadtest(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+回放录制的 websocket 事件流（录制方法见 mirai/settings.py 中的 RECORD_PATH）
+事件经过完整的 Mirai 分发逻辑与全部模块，出站 HTTP 调用只记录不发送
+
+    python -m bench.replay 录制文件 [--speed 倍速 | --max] [--latency 毫秒]
+                                    [--unlimited] [--dump 出站调用输出文件]
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from mirai.application import Mirai
+from mirai.record import readRecording
+from core.outbound import SendQueue
+from util import codec
+
+
+class CaptureClient:
+    """代替 HttpClient，记录出站调用并返回伪造的成功响应"""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency: float = latency
+        self.calls: List[Tuple[float, str, Dict[str, Any]]] = []
+        self.__messageIds = itertools.count(1)
+
+    async def post(self, api: str, payload: Dict[str, Any]) -> dict:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        self.calls.append((time.time(), api, payload))
+        return {'code': 0, 'msg': 'success', 'messageId': next(self.__messageIds)}
+
+    async def get(self, api: str, params: Dict[str, Any] = None) -> dict:
+        return await self.post(api, params)
+
+    async def close(self) -> None:
+        pass
+
+
+class ReplayMirai(Mirai):
+
+    def __init__(self, latency: float = 0.0, unlimited: bool = False) -> None:
+        super().__init__()
+        self.http = CaptureClient(latency)
+        if unlimited:
+            self.outbound = SendQueue(
+                self._deliver, rate=1e9, burst=10 ** 9,
+                globalRate=1e9, globalBurst=10 ** 9, window=0)
+            self.pipeline.remove('ratelimit')
+        self.latencies: List[float] = []
+
+    async def _dispatch(self, response: dict) -> None:
+        start = time.perf_counter()
+        await super()._dispatch(response)
+        self.latencies.append(time.perf_counter() - start)
+
+
+def percentile(values: List[float], p: float) -> float:
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def replay(app: ReplayMirai, path: str, speed: float) -> Tuple[int, float]:
+    await app._init_modules()
+    loop = asyncio.get_event_loop()
+    frames = 0
+    first = None
+    start = loop.time()
+    for timestamp, frame in readRecording(path):
+        if speed is not None:
+            if first is None:
+                first = timestamp
+            delay = (timestamp - first) / speed - (loop.time() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await app._feed(frame)
+        frames += 1
+    await app.dispatcher.join()
+    await app.outbound.join()
+    return frames, loop.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回放录制的 websocket 事件流')
+    parser.add_argument('path')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，默认 1')
+    parser.add_argument('--max', action='store_true', help='不按时间戳等待，尽快回放')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟每次出站调用的延迟（毫秒）')
+    parser.add_argument('--unlimited', action='store_true', help='关闭入站、出站限速与出站合并')
+    parser.add_argument('--dump', help='将捕获的出站调用写入该文件（每行一个 JSON）')
+    args = parser.parse_args()
+
+    app = ReplayMirai(args.latency / 1000, args.unlimited)
+    speed = None if args.max else args.speed
+    frames, elapsed = asyncio.get_event_loop().run_until_complete(
+        replay(app, args.path, speed))
+
+    events = len(app.latencies)
+    print(f'帧数 {frames}  分发事件 {events}  用时 {elapsed:.3f}s  '
+          f'吞吐 {events / elapsed if elapsed > 0 else 0:.1f} 事件/秒')
+    print('处理耗时 ' + '  '.join(
+        f'{name} {percentile(app.latencies, p) * 1000:.2f}ms'
+        for name, p in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))))
+    apis = Counter(api for _, api, _ in app.http.calls)
+    print('出站调用 ' + ('  '.join(f'{api} {cnt}' for api, cnt in apis.most_common()) or '无'))
+
+    if args.dump is not None:
+        with open(args.dump, 'w', encoding='utf-8') as f:
+            for timestamp, api, payload in app.http.calls:
+                f.write(codec.dumps({'time': timestamp, 'api': api, 'payload': payload}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+本地 mirai-api-http 替身，用于压测
+提供 websocket /all 与适配器用到的 HTTP 接口，按配置合成群消息流量，
+并可为发送类接口注入延迟。群号为 1..N，成员号为 10001..10000+M
+
+    python -m bench.stubserver [--port 8089] [--groups 10] [--members 50]
+                               [--rate 100] [--commands '.google yoz=0.1']
+                               [--latency 20] [--duration 60]
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+
+from aiohttp import web
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from util import codec
+
+
+SEND_APIS = ('sendGroupMessage', 'sendFriendMessage', 'sendTempMessage', 'sendImageMessage')
+OTHER_APIS = ('mute', 'unmute', 'recall', 'memberInfo', 'muteAll', 'unmuteAll')
+
+
+def parseCommands(spec: str) -> List[Tuple[str, float]]:
+    """'.google yoz=0.1,.种树=0.01' -> [('.google yoz', 0.1), ('.种树', 0.01)]"""
+    commands = []
+    if spec:
+        for item in spec.split(','):
+            text, _, weight = item.rpartition('=')
+            commands.append((text, float(weight)))
+    return commands
+
+
+def percentile(values: List[float], p: float) -> float:
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class StubServer:
+
+    def __init__(self, groups: int = 10, members: int = 50, rate: float = 100,
+                 commands: List[Tuple[str, float]] = None, latency: float = 0.0,
+                 chatter: List[str] = None) -> None:
+        self.groups: int = groups
+        self.members: int = members
+        self.rate: float = rate
+        self.commands: List[Tuple[str, float]] = commands or []
+        self.latency: float = latency
+        self.chatter: List[str] = chatter or ['早', '哈哈哈', '在吗', '+1']
+
+        self.emitted: int = 0
+        self.commandsEmitted: int = 0
+        self.calls: Dict[str, int] = {}
+        self.replyLatencies: List[float] = []
+        self.started: float = None
+        # 每个群中尚未收到回复的指令的发出时间
+        self.__pending: Dict[int, Deque[float]] = {}
+        self.__messageIds = itertools.count(1)
+        self.__sockets: List[web.WebSocketResponse] = []
+
+        self.app = web.Application()
+        self.app.router.add_get('/all', self.__socket)
+        for api in SEND_APIS + OTHER_APIS:
+            self.app.router.add_post(f'/{api}', self.__endpoint(api))
+        self.__runner: web.AppRunner = None
+        self.__producer: asyncio.Task = None
+
+    async def start(self, host: str = 'localhost', port: int = 8089) -> None:
+        self.__runner = web.AppRunner(self.app)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host, port).start()
+
+    async def stop(self) -> None:
+        if self.__producer is not None:
+            self.__producer.cancel()
+        for ws in self.__sockets:
+            await ws.close()
+        await self.__runner.cleanup()
+
+    async def __socket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.__sockets.append(ws)
+        await ws.send_str(codec.dumps({'syncId': '', 'data': {'code': 0, 'session': 'stub-session'}}))
+        if self.__producer is None:
+            self.__producer = asyncio.ensure_future(self.__produce())
+        async for _ in ws:
+            pass
+        return ws
+
+    def __endpoint(self, api: str):
+        async def handler(request: web.Request) -> web.Response:
+            payload = await request.json(loads=codec.loads)
+            self.calls[api] = self.calls.get(api, 0) + 1
+            if api in SEND_APIS and self.latency > 0:
+                await asyncio.sleep(self.latency)
+            if api == 'sendGroupMessage':
+                pending = self.__pending.get(payload.get('target'))
+                if pending:
+                    self.replyLatencies.append(time.monotonic() - pending.popleft())
+            resp = {'code': 0, 'msg': 'success'}
+            if api in SEND_APIS:
+                resp['messageId'] = next(self.__messageIds)
+            return web.Response(text=codec.dumps(resp), content_type='application/json')
+        return handler
+
+    def __synthesize(self) -> Tuple[int, bool, str]:
+        groupId = random.randint(1, self.groups)
+        roll = random.random()
+        for text, weight in self.commands:
+            if roll < weight:
+                return groupId, True, text
+            roll -= weight
+        return groupId, False, random.choice(self.chatter)
+
+    async def __produce(self) -> None:
+        self.started = time.monotonic()
+        for i in itertools.count():
+            delay = self.started + i / self.rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            groupId, isCommand, text = self.__synthesize()
+            memberId = 10000 + random.randint(1, self.members)
+            frame = codec.dumps({'syncId': '-1', 'data': {
+                'type': 'GroupMessage',
+                'messageChain': [
+                    {'type': 'Source', 'id': next(self.__messageIds), 'time': int(time.time())},
+                    {'type': 'Plain', 'text': text}
+                ],
+                'sender': {
+                    'id': memberId,
+                    'memberName': f'成员{memberId}',
+                    'permission': 'MEMBER',
+                    'group': {'id': groupId, 'name': f'群{groupId}', 'permission': 'ADMINISTRATOR'}
+                }
+            }})
+            if isCommand:
+                self.__pending.setdefault(groupId, deque()).append(time.monotonic())
+                self.commandsEmitted += 1
+            self.emitted += 1
+            for ws in self.__sockets:
+                if not ws.closed:
+                    await ws.send_str(frame)
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.started if self.started is not None else 0
+        lines = [
+            f'已发出事件 {self.emitted}（指令 {self.commandsEmitted}）  用时 {elapsed:.1f}s  '
+            f'{self.emitted / elapsed if elapsed > 0 else 0:.1f} 事件/秒',
+            f'收到回复 {len(self.replyLatencies)}  回复延迟 ' + '  '.join(
+                f'{name} {percentile(self.replyLatencies, p) * 1000:.1f}ms'
+                for name, p in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))),
+            '接口调用 ' + ('  '.join(f'{api} {cnt}' for api, cnt in sorted(self.calls.items())) or '无')
+        ]
+        return '\n'.join(lines)
+
+
+def addArguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--groups', type=int, default=10, help='群数量')
+    parser.add_argument('--members', type=int, default=50, help='每群成员数量')
+    parser.add_argument('--rate', type=float, default=100, help='每秒合成的消息数')
+    parser.add_argument('--commands', default='.google yoz=0.1',
+                        help='指令及其占比，如 ".google yoz=0.1,.种树=0.01"')
+    parser.add_argument('--latency', type=float, default=0.0, help='发送类接口注入的延迟（毫秒）')
+    parser.add_argument('--duration', type=float, default=60, help='运行时长（秒）')
+
+
+def fromArguments(args: argparse.Namespace) -> StubServer:
+    return StubServer(args.groups, args.members, args.rate,
+                      parseCommands(args.commands), args.latency / 1000)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = fromArguments(args)
+    await server.start(args.host, args.port)
+    print(f'mirai 替身已启动于 {args.host}:{args.port}')
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        print(server.report())
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 mirai-api-http 替身')
+    addArguments(parser)
+    asyncio.get_event_loop().run_until_complete(serve(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
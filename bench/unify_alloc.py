@@ -0,0 +1,89 @@
+"""
+统一事件字典的分配与耗时基准
+对比旧的 deepcopy 实现与当前只复制 sender 层的实现
+
+    python -m bench.unify_alloc [次数]
+"""
+import sys
+import timeit
+import tracemalloc
+
+from copy import deepcopy
+
+import mirai.unify as unify
+
+
+SAMPLE = {
+    'type': 'GroupMessage',
+    'sender': {
+        'id': 123456789,
+        'memberName': '群友',
+        'specialTitle': '',
+        'permission': 'MEMBER',
+        'joinTimestamp': 1600000000,
+        'lastSpeakTimestamp': 1600000000,
+        'muteTimeRemaining': 0,
+        'group': {
+            'id': 987654321,
+            'name': '测试群',
+            'permission': 'ADMINISTRATOR'
+        }
+    },
+    'messageChain': [
+        {'type': 'Source', 'id': 12345, 'time': 1600000000},
+        {'type': 'At', 'target': 1516161873, 'display': '@猫猫'},
+        {'type': 'Plain', 'text': ' 今天天气怎么样'},
+        {'type': 'Image', 'imageId': '{01E9451B-70ED-EAE3-B37C-101F1EEBF5B5}.jpg',
+         'url': 'https://example.com/image.jpg', 'path': None}
+    ]
+}
+
+
+def legacyUnifyEventDict(event_dict: dict) -> dict:
+    """旧实现，作为对照"""
+    event_dict = deepcopy(event_dict)
+    permissionMap = {
+        'OWNER': 'Owner',
+        'ADMINISTRATOR': 'Admin',
+        'ADMIN': 'Admin',
+        'MEMBER': 'Member'
+    }
+    if 'sender' in event_dict:
+        sender = event_dict['sender']
+        if 'permission' in sender:
+            event_dict['sender']['permission'] = \
+                permissionMap[sender['permission'].upper()]
+        if 'group' in sender:
+            group = sender['group']
+            if 'permission' in group:
+                event_dict['sender']['group']['permission'] = \
+                    permissionMap[group['permission'].upper()]
+    return event_dict
+
+
+def allocations(func, times: int):
+    """保留全部结果，统计每个事件净分配的内存块数与字节数"""
+    kept = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(times):
+        kept.append(func(SAMPLE))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    return blocks / times, size / times
+
+
+def main():
+    times = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for name, func in (('deepcopy', legacyUnifyEventDict),
+                       ('view', unify.unifyEventDict)):
+        blocks, size = allocations(func, times)
+        cost = timeit.timeit(lambda: func(SAMPLE), number=times) / times
+        print(f'{name:>8}: {blocks:6.1f} 块/事件  {size:8.1f} 字节/事件  {cost * 1e6:7.2f} us/事件')
+
+
+if __name__ == '__main__':
+    main()
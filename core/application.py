@@ -1,126 +1,197 @@
+import asyncio
+
 from abc import ABC, abstractmethod
+from types import ModuleType
 from typing import Callable, Dict, List, overload
+from core.loader import Loader
 from core.message import Message
+from core.pipeline import Pipeline
+from core.redirect import RedirectRegistry
+from core.router import CommandRouter
+from core import context
+from core import stages
 from core.entity.group import Group, Member
 from core.entity.contact import Contact
 
 
 class App(ABC):
+    """
+    平台接口
+    所有与平台交互的方法均为协程，需要 await 调用
+    """
 
     def __init__(self) -> None:
+        # 本实例登录的账号，同一进程可运行多个账号
+        self.account: int
         self.nickname: str
         self.commandHead: str
+        # 以下由平台适配器创建，供下面的通用实现使用
+        self.redirects: RedirectRegistry
+        self.groupRouter: CommandRouter
+        self.contactRouter: CommandRouter
+        self.pipeline: Pipeline
 
     @abstractmethod
     def run(self):
         """启动运行"""
         pass
 
-    @abstractmethod
-    def redirect(self, guid: str, filter: dict, hook: Callable) -> None:
-        pass
+    def redirect(self, guid: str, filter: dict, hook: Callable, ttl: float=None) -> None:
+        """将满足 filter 的消息重定向至 hook，超过 ttl 秒未触发自动失效"""
+        self.redirects.add(guid, filter, hook, ttl)
 
-    @abstractmethod
-    def redirectMember(self, guid: str, groupId: int, memberId: int, hook: Callable) -> None:
-        pass
+    def redirectMember(self, guid: str, groupId: int, memberId: int, hook: Callable, ttl: float=None) -> None:
+        """将群中某成员的消息重定向至 hook"""
+        self.redirects.addMember(guid, groupId, memberId, hook, ttl)
 
-    @abstractmethod
-    def redirectContact(self, guid: str, contactId: int, hook: Callable) -> None:
-        pass
+    def redirectContact(self, guid: str, contactId: int, hook: Callable, ttl: float=None) -> None:
+        """将某联系人的消息重定向至 hook"""
+        self.redirects.addContact(guid, contactId, hook, ttl)
 
-    @abstractmethod
     def unredirect(self, guid: str) -> None:
-        pass
+        """卸载重定向"""
+        self.redirects.remove(guid)
+
+    async def _sweep_redirects(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.redirects.sweep()
+
+    @staticmethod
+    def _conversation_key(response: dict):
+        """同一会话的事件需要保序：群消息按 (群, 成员)，私聊与临时消息按联系人"""
+        eventName = response['type']
+        if eventName == 'GroupMessage':
+            return ('group', response['sender']['group']['id'], response['sender']['id'])
+        elif eventName == 'FriendMessage' or eventName == 'TempMessage':
+            return ('contact', response['sender']['id'])
+        return None
+
+    async def _dispatch(self, response: dict, originGroupId: int = None) -> None:
+        """以统一后的事件字典运行入站管线"""
+        ctx = context.EventContext(self, response, originGroupId)
+        token = context.enter(ctx)
+        try:
+            await self.pipeline.run(ctx)
+        finally:
+            context.leave(token)
+
+    def _build_pipeline(self, settings: ModuleType, events: Dict[str, type]) -> Pipeline:
+        """标准入站管线，settings 为平台的配置模块，events 为事件名到核心事件类的映射"""
+        pipeline = Pipeline()
+        pipeline.register('blacklist', stages.blacklist(settings.BLACK_LIST))
+        pipeline.register('dedup', stages.dedup(settings.DEDUP_SIZE))
+        pipeline.register('ratelimit', stages.ratelimit(settings.INBOUND_RATE, settings.INBOUND_BURST))
+        pipeline.register('redirect', stages.redirect(self.redirects, events))
+        pipeline.register('command', stages.command({
+            'GroupMessage': self.groupRouter,
+            'FriendMessage': self.contactRouter
+        }, events))
+        pipeline.register('listeners', stages.listeners(events))
+        for name, stage, before in Loader.middlewares:
+            pipeline.register(name, stage, before=before)
+        pipeline.compile()
+        return pipeline
+
+    async def reloadModules(self, names: List[str]) -> Dict[str, str]:
+        """逐个热重载 module 包下的模块，返回重载失败的模块及原因"""
+        failures = {}
+        for name in names:
+            try:
+                await Loader.reload(self, name)
+            except Exception as e:
+                failures[name] = str(e)
+        return failures
     
     @abstractmethod
     @overload
-    def sendGroupMessage(self, group: int, message: Message) -> Message:
+    async def sendGroupMessage(self, group: int, message: Message) -> Message:
         pass
 
     @abstractmethod
     @overload
-    def sendGroupMessage(self, group: int, message: str) -> Message:
+    async def sendGroupMessage(self, group: int, message: str) -> Message:
         pass
 
     @abstractmethod
-    def sendGroupMessage(self, group, message) -> Message:
+    async def sendGroupMessage(self, group, message) -> Message:
         """发送群消息"""
         pass
 
     @abstractmethod
-    def setSpecialTitle(self, group: int, id: int, title: str) -> None:
+    async def setSpecialTitle(self, group: int, id: int, title: str) -> None:
         pass
     
     @abstractmethod
-    def mute(self, group: int, id: int, time: int) -> None:
+    async def mute(self, group: int, id: int, time: int) -> None:
         """对群成员禁言，单位分钟"""
         pass
 
-    def unmute(self, group: int, id: int) -> None:
+    async def unmute(self, group: int, id: int) -> None:
         """对群成员解除禁言"""
         pass
 
     @abstractmethod
-    def muteAll(self, group: int) -> None:
+    async def muteAll(self, group: int) -> None:
         """对群开启全体禁言"""
         pass
 
     @abstractmethod
-    def unmuteAll(self, group: int) -> None:
+    async def unmuteAll(self, group: int) -> None:
         """对群关闭群体禁言"""
         pass
 
     @abstractmethod
     @overload
-    def sendContactMessage(self, contact: int, message: Message, group: int=None) -> Message:
+    async def sendContactMessage(self, contact: int, message: Message, group: int=None) -> Message:
         pass
     
     @abstractmethod
     @overload
-    def sendContactMessage(self, contact: int, message: str, group: int=None) -> Message:
+    async def sendContactMessage(self, contact: int, message: str, group: int=None) -> Message:
         pass
 
     @abstractmethod
-    def sendContactMessage(self, contact, message, group: int=None) -> Message:
+    async def sendContactMessage(self, contact, message, group: int=None) -> Message:
         """发送联系人消息（group参数适配mirai）"""
         pass
 
     @abstractmethod
-    def replyContactMessage(self, sender: Contact, message) -> Message:
+    async def replyContactMessage(self, sender: Contact, message) -> Message:
         """回复联系人消息"""
         pass
 
     @abstractmethod
-    def recall(self, messageId: int) -> None:
+    async def recall(self, messageId: int) -> None:
         """撤回消息"""
         pass
 
     @abstractmethod
-    def sendWebImage(self, urls: List[str], contactId: int=None, groupId: int=None) -> Message:
+    async def sendWebImage(self, urls: List[str], contactId: int=None, groupId: int=None) -> Message:
         """发送URL图片"""
         pass
 
     @abstractmethod
-    def getContactList(self) -> List[Contact]:
+    async def getContactList(self) -> List[Contact]:
         """获得联系人列表 *联系人模型还没有设计完"""
         pass
 
     @abstractmethod
-    def getGroupList(self) -> List[Group]:
+    async def getGroupList(self) -> List[Group]:
         """获取群列表"""
         pass
 
     @abstractmethod
-    def getMemberList(self, group: int) -> List[Member]:
+    async def getMemberList(self, group: int) -> List[Member]:
         """获取群成员列表（Member模型还未验证）"""
         pass
 
     @abstractmethod
-    def kick(self, group: int, target: int, msg: str) -> None:
+    async def kick(self, group: int, target: int, msg: str) -> None:
         """踢出成员，需要权限，注意异常处理（异常还未设计）"""
         pass
 
     @abstractmethod
-    def quit(self, group: int) -> None:
+    async def quit(self, group: int) -> None:
         """退群，群主不能退群，注意异常处理（异常还未设计）"""
         pass
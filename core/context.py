@@ -0,0 +1,43 @@
+import itertools
+import os
+
+from contextvars import ContextVar, Token
+from typing import Any, Optional
+
+
+_traceIds = itertools.count(1)
+_tracePrefix = f'{os.getpid():x}'
+
+
+class EventContext:
+    """
+    当前正在处理的事件的上下文
+    由分发器在处理每个事件前设置，处理函数及 App 方法可通过 current() 读取
+    """
+
+    def __init__(self, app: Any, response: dict, originGroupId: int = None) -> None:
+        self.app = app
+        self.response: dict = response
+        self.event: Any = None
+        # 临时会话消息所来自的群，非临时消息为 None
+        self.originGroupId: Optional[int] = originGroupId
+        self.traceId: str = f'{_tracePrefix}-{next(_traceIds)}'
+
+    @property
+    def temp(self) -> bool:
+        return self.originGroupId is not None
+
+
+_current: ContextVar = ContextVar('yoz_event_context', default=None)
+
+
+def current() -> Optional[EventContext]:
+    return _current.get()
+
+
+def enter(ctx: EventContext) -> Token:
+    return _current.set(ctx)
+
+
+def leave(token: Token) -> None:
+    _current.reset(token)
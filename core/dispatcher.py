@@ -0,0 +1,94 @@
+import asyncio
+import traceback
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Tuple
+
+from core.metrics import metrics
+
+
+Job = Tuple[Callable[..., Awaitable], tuple]
+
+
+class Dispatcher:
+    """
+    并发事件分发器
+    同一会话（key 相同）的事件严格按到达顺序处理，不同会话之间并行，
+    同时执行的事件不超过 maxInflight；每个会话排队的事件不超过 maxPending，
+    超出的事件被丢弃，所有会话排队的事件合计不超过 maxBacklog
+    """
+
+    def __init__(self, maxInflight: int = 64, maxPending: int = 32, maxBacklog: int = 1024) -> None:
+        self.maxInflight: int = maxInflight
+        self.maxPending: int = maxPending
+        self.maxBacklog: int = maxBacklog
+        self.__slots: asyncio.Semaphore = None
+        self.__queues: Dict[Hashable, Deque[Job]] = {}
+        # 已提交、尚未完成的事件数
+        self.__pending: int = 0
+        self.__inflight: int = 0
+        self.__idle: asyncio.Event = None
+        self.__vacancy: asyncio.Event = None
+
+    async def submit(self, key: Hashable, func: Callable[..., Awaitable], *args: Any) -> bool:
+        """
+        提交一个事件处理任务，该会话排队已满时丢弃任务并返回 False
+        排队总数已满时会等待空位（对读取端形成背压），key 为 None 时该任务不参与排序
+        """
+        if self.__slots is None:
+            self.__slots = asyncio.Semaphore(self.maxInflight)
+            self.__idle = asyncio.Event()
+            self.__idle.set()
+            self.__vacancy = asyncio.Event()
+            self.__vacancy.set()
+        while self.__pending >= self.maxBacklog:
+            self.__vacancy.clear()
+            await self.__vacancy.wait()
+        queue = self.__queues.get(key) if key is not None else None
+        if queue is not None and len(queue) >= self.maxPending:
+            print(f'会话 {key} 排队的事件过多，丢弃新事件')
+            metrics.error('dispatch', 'overflow')
+            return False
+        self.__pending += 1
+        self.__idle.clear()
+
+        if key is None:
+            asyncio.ensure_future(self.__run(func, args))
+            return True
+        if queue is not None:
+            queue.append((func, args))
+            return True
+        self.__queues[key] = deque([(func, args)])
+        asyncio.ensure_future(self.__drain(key))
+        return True
+
+    async def join(self) -> None:
+        """等待所有已提交的任务完成"""
+        if self.__idle is not None:
+            await self.__idle.wait()
+
+    def inflight(self) -> int:
+        return self.__inflight
+
+    async def __drain(self, key: Hashable) -> None:
+        queue = self.__queues[key]
+        while queue:
+            func, args = queue.popleft()
+            await self.__run(func, args)
+        del self.__queues[key]
+
+    async def __run(self, func: Callable[..., Awaitable], args: tuple) -> None:
+        # 事件开始执行时才占用在途名额，排队中的事件不占用
+        async with self.__slots:
+            self.__inflight += 1
+            try:
+                await func(*args)
+            except Exception:
+                print('事件处理时出现异常:')
+                traceback.print_exc()
+            finally:
+                self.__inflight -= 1
+        self.__pending -= 1
+        self.__vacancy.set()
+        if self.__pending == 0:
+            self.__idle.set()
@@ -1,11 +1,10 @@
-import re
-from core.message import Message
+from core.entity.group import Entity
 
 
-class Contact:
+class Contact(Entity):
 
-    def __init__(self, id: int, nickname: str, remark: str, fromGroup: int=None) -> None:
-        self.id: int = id
-        self.nickname: str = nickname
-        self.remark: str = remark
-        self.fromGroup = fromGroup
+    __slots__ = ('id', 'nickname', 'remark', 'fromGroup')
+
+    def __new__(cls, id: int, nickname: str, remark: str, fromGroup: int=None) -> 'Contact':
+        return cls._intern((id, nickname, remark, fromGroup), id=id,
+                           nickname=nickname, remark=remark, fromGroup=fromGroup)
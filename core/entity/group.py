@@ -1,4 +1,5 @@
 from enum import Enum, unique
+from weakref import WeakValueDictionary
 
 
 @unique
@@ -6,20 +7,60 @@ class PermissionType(Enum):
     Owner = 1
     Admin = 2
     Member = 3
-    
 
-class Member:
 
-    def __init__(self, id: int, memberName: str, permission: str) -> None:
-        self.id: int = id
-        self.inGroupName: str = memberName
-        self.permission: PermissionType = PermissionType[permission]
+class Entity:
+    """
+    不可变实体的基类
+    字段相同的实例会被复用（驻留），同一群、同一成员的事件共享同一对象
+    """
 
+    __slots__ = ('__weakref__',)
 
-class Group:
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f'{type(self).__name__} 不可修改')
 
-    def __init__(self, id: int, groupName: str, permission: str) -> None:
-        self.id: int = id
-        self.name: str = groupName
-        self.permission: PermissionType = PermissionType[permission]
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f'{type(self).__name__} 不可修改')
 
+    @classmethod
+    def _intern(cls, key: tuple, **fields):
+        pool = cls.__dict__.get('_pool')
+        if pool is None:
+            pool = WeakValueDictionary()
+            type.__setattr__(cls, '_pool', pool)
+        obj = pool.get(key)
+        if obj is None:
+            obj = object.__new__(cls)
+            for name, value in fields.items():
+                object.__setattr__(obj, name, value)
+            pool[key] = obj
+        return obj
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo: dict):
+        return self
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in type(self).__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class Member(Entity):
+
+    __slots__ = ('id', 'inGroupName', 'permission')
+
+    def __new__(cls, id: int, memberName: str, permission: str) -> 'Member':
+        return cls._intern((id, memberName, permission), id=id,
+                           inGroupName=memberName, permission=PermissionType[permission])
+
+
+class Group(Entity):
+
+    __slots__ = ('id', 'name', 'permission')
+
+    def __new__(cls, id: int, groupName: str, permission: str) -> 'Group':
+        return cls._intern((id, groupName, permission), id=id,
+                           name=groupName, permission=PermissionType[permission])
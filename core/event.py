@@ -1,3 +1,5 @@
+from functools import cached_property
+
 from core.entity.contact import Contact
 from core.entity.group import Group, Member
 from core.extern.event.enums import EventType
@@ -9,61 +11,68 @@ class BaseEvent:
 
     def __init__(self, type: EventType) -> None:
         self.type: EventType
+        # 接收到该事件的账号，由分发时填入
+        self.account: int = None
 
         self.type = type
 
 
 class GroupMessageRecvEvent(BaseEvent):
+    """
+    群消息事件
+    只保存原始字典，sender、group、msg 在首次访问时构造并缓存
+    """
 
     def __init__(self, data: dict) -> None:
-        self.msg: Message
-        self.sender: Member
-        self.group: Group
-
         super().__init__(EventType.GroupMessageEvent)
-        senderInfo = data['sender']
-        id = senderInfo['id']
-        memberName = senderInfo['memberName']
-        permission = senderInfo['permission']
-
-        groupInfo = senderInfo['group']
-        groupId = groupInfo['id']
-        groupName = groupInfo['name']
-        groupPermission = groupInfo['permission']
-
-        self.msg = Message(chain=data['messageChain'])
-        self.sender = Member(
-            id=id,
-            memberName=memberName,
-            permission=permission
+        self.data: dict = data
+
+    @cached_property
+    def msg(self) -> Message:
+        return Message(chain=self.data['messageChain'])
+
+    @cached_property
+    def sender(self) -> Member:
+        senderInfo = self.data['sender']
+        return Member(
+            id=senderInfo['id'],
+            memberName=senderInfo['memberName'],
+            permission=senderInfo['permission']
         )
-        self.group = Group(
-            id=groupId,
-            groupName=groupName,
-            permission=groupPermission
+
+    @cached_property
+    def group(self) -> Group:
+        groupInfo = self.data['sender']['group']
+        return Group(
+            id=groupInfo['id'],
+            groupName=groupInfo['name'],
+            permission=groupInfo['permission']
         )
 
 
 class ContactMessageRecvEvent(BaseEvent):
+    """
+    联系人消息事件
+    只保存原始字典，sender、msg 在首次访问时构造并缓存
+    """
 
     def __init__(self, data: dict) -> None:
-        self.sender: Contact
-        self.msg: Message
-
         super().__init__(EventType.ContactMessageEvent)
-        self.msg = Message(chain=data['messageChain'])
-        senderInfo = data['sender']
-        id = senderInfo['id']
-        nickname = senderInfo['nickname']
-        remark = senderInfo['remark']
+        self.data: dict = data
+
+    @cached_property
+    def msg(self) -> Message:
+        return Message(chain=self.data['messageChain'])
+
+    @cached_property
+    def sender(self) -> Contact:
+        senderInfo = self.data['sender']
         fromGroup = None
         if 'group' in senderInfo:
             fromGroup = senderInfo['group']['id']
-        self.msg = Message(chain=data['messageChain'])
-        self.sender = Contact(
-            id=id,
-            nickname=nickname,
-            remark=remark,
+        return Contact(
+            id=senderInfo['id'],
+            nickname=senderInfo['nickname'],
+            remark=senderInfo['remark'],
             fromGroup=fromGroup
         )
-
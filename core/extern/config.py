@@ -2,12 +2,18 @@ import io
 import copy
 import shutil
 import os
+import asyncio
+import yaml
 
 from pathlib import Path
+from typing import Any, Dict, List, Tuple
 
 class Config:
     __configPath = './config'
-    
+
+    # 路径 -> (修改时间, 解析结果)，文件未修改时各模块共用同一份解析结果
+    __parsed: Dict[str, Tuple[int, Any]] = {}
+
     @classmethod
     def update(cls, default: dict, loaded: dict) -> dict:
         new = copy.deepcopy(default)
@@ -20,6 +26,28 @@ class Config:
                 new[key] = loaded[key]
         return new
 
+    @staticmethod
+    def __accepts(default: Any, value: Any) -> bool:
+        if isinstance(default, bool) or isinstance(value, bool):
+            return isinstance(default, bool) and isinstance(value, bool)
+        if isinstance(default, (int, float)):
+            return isinstance(value, (int, float))
+        return isinstance(value, type(default))
+
+    @classmethod
+    def validate(cls, default: dict, settings: dict, prefix: str = '') -> List[str]:
+        """类型与默认值不符的配置项改回默认值（默认值为 None 的项不检查），返回这些项的名称"""
+        invalid = []
+        for key, value in default.items():
+            if value is None:
+                continue
+            if isinstance(value, dict) and isinstance(settings[key], dict):
+                invalid += cls.validate(value, settings[key], f'{prefix}{key}.')
+            elif not cls.__accepts(value, settings[key]):
+                settings[key] = copy.deepcopy(value)
+                invalid.append(f'{prefix}{key}')
+        return invalid
+
     def __init__(self, moduleName: str) -> None:
         self.moduleName = moduleName
 
@@ -33,12 +61,72 @@ class Config:
             return open(path, 'r+', encoding='utf-8')
         else:
             return None
-    
+
     def touch(self, fileName: str) -> io.TextIOWrapper:
         path = f'{Config.__configPath}/{self.moduleName}/{fileName}'
         Path(path).touch()
         return open(path, 'r+', encoding='utf-8')
-    
+
     def backup(self, fileName: str) -> None:
         path = f'{Config.__configPath}/{self.moduleName}/{fileName}'
         shutil.copyfile(path, f'{path}.bkp')
+
+    @staticmethod
+    def __parse(path: str) -> Any:
+        with open(path, encoding='utf-8') as f:
+            return yaml.load(f, Loader=yaml.FullLoader)
+
+    @staticmethod
+    def __dump(path: str, settings: dict) -> int:
+        with open(path, 'w', encoding='utf-8') as f:
+            yaml.dump(settings, f)
+        return os.stat(path).st_mtime_ns
+
+    async def read(self, fileName: str) -> Any:
+        """
+        在线程池中解析 YAML 文件，文件不存在时返回 None
+        解析结果按修改时间缓存并共享，调用方不要修改
+        """
+        path = f'{Config.__configPath}/{self.moduleName}/{fileName}'
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = Config.__parsed.get(path)
+        if cached is None or cached[0] != mtime:
+            parsed = await asyncio.get_event_loop().run_in_executor(None, Config.__parse, path)
+            cached = Config.__parsed[path] = (mtime, parsed)
+        return cached[1]
+
+    async def load(self, fileName: str, default: dict) -> dict:
+        """
+        读取配置并与默认配置合并，类型不符的项使用默认值，合并结果写回文件以补全新增的配置项
+        文件损坏时备份为 .bkp 并使用默认配置，备份失败时不覆写
+        """
+        loop = asyncio.get_event_loop()
+        overwrite = True
+        try:
+            loaded = await self.read(fileName)
+            settings = self.update(default, loaded) if loaded is not None else copy.deepcopy(default)
+        except Exception as e:
+            print(f'{self.moduleName} 的 {fileName} 损坏，重置为默认配置，旧文件备份为 {fileName}.bkp: ', e)
+            settings = copy.deepcopy(default)
+            try:
+                await loop.run_in_executor(None, self.backup, fileName)
+            except Exception as e:
+                print(f'备份失败，使用默认配置，取消覆写 {fileName}: ', e)
+                overwrite = False
+
+        invalid = self.validate(default, settings)
+        if invalid:
+            print(f'{self.moduleName} 的配置项 {", ".join(invalid)} 类型与默认值不符，已使用默认值')
+
+        if overwrite:
+            await self.save(fileName, settings)
+        return settings
+
+    async def save(self, fileName: str, settings: dict) -> None:
+        """在线程池中写入配置，并更新缓存"""
+        path = f'{Config.__configPath}/{self.moduleName}/{fileName}'
+        mtime = await asyncio.get_event_loop().run_in_executor(None, Config.__dump, path, settings)
+        Config.__parsed[path] = (mtime, copy.deepcopy(settings))
@@ -1,4 +1,12 @@
-from typing import Any, Awaitable, Callable, Dict, List
+import asyncio
+import importlib
+import os
+import signal
+import sys
+import time
+import traceback
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
 from enum import Enum
 
 
@@ -20,11 +28,62 @@ class Loader:
         str, Callable
     ] = {}
 
+    middlewares: List[
+        Tuple[str, Callable[[Any], Awaitable[bool]], str]
+    ] = []
+
+    # 按群启用的模块 -> 启用的群，未声明的模块在所有群中启用
+    enabledGroups: Dict[
+        str, Set[int]
+    ] = {}
+
+    handlerModules: Dict[
+        Callable, str
+    ] = {}
+
+    __listenerCache: Dict[
+        Tuple[str, int], Tuple[Callable, ...]
+    ] = {}
+
+    commandSubscribers: Dict[
+        CommandType, List[Callable[[str, Callable], None]]
+    ] = {}
+
+    commandUnsubscribers: Dict[
+        CommandType, List[Callable[[str], None]]
+    ] = {}
+
+    # 在进程内保存状态（数据库文件、计时器）的模块，不能在多个进程中同时运行
+    statefulModules: Set[str] = set()
+
+    # 延迟加载的模块 -> 加载任务，首次收到相关指令或事件时才触发 Load
+    deferred: Dict[
+        str, Optional[asyncio.Future]
+    ] = {}
+
+    # 启动耗时，模块 -> 阶段（import、load） -> 秒
+    profile: Dict[
+        str, Dict[str, float]
+    ] = {}
+
+    # 单个模块 Load 的超时（秒），为 None 时不限，由 loadAll 设置
+    loadTimeout: Optional[float] = None
+
+    # 清单中要求导入的模块，包括导入失败的
+    manifest: List[str] = []
+
+    # 导入或加载失败的模块 -> 错误信息
+    failures: Dict[
+        str, str
+    ] = {}
+
     @classmethod
     def listen(cls, eventName: str):
         def lis_decorator(func: Callable):
             cls.eventsListener.setdefault(eventName, [])
             cls.eventsListener[eventName].append(func)
+            cls.handlerModules[func] = cls.moduleOf(func)
+            cls.__listenerCache.clear()
             return func
         return lis_decorator
     
@@ -39,5 +98,296 @@ class Loader:
                 if command in cls.contactCommands:
                     raise Exception("指令重复注册")
                 cls.contactCommands[command] = func
+            cls.handlerModules[func] = cls.moduleOf(func)
+            for subscriber in cls.commandSubscribers.get(base, []):
+                subscriber(command, func)
             return func
         return cmd_decorator
+
+    @classmethod
+    def subscribe(cls, base: CommandType, subscriber: Callable[[str, Callable], None],
+                  unsubscriber: Callable[[str], None] = None):
+        """订阅指令注册，已注册的指令会立即补发给订阅者；模块卸载时以指令名调用 unsubscriber"""
+        cls.commandSubscribers.setdefault(base, [])
+        cls.commandSubscribers[base].append(subscriber)
+        if unsubscriber is not None:
+            cls.commandUnsubscribers.setdefault(base, [])
+            cls.commandUnsubscribers[base].append(unsubscriber)
+        commands = cls.groupCommands if base == CommandType.Group else cls.contactCommands
+        for command, func in commands.items():
+            subscriber(command, func)
+
+    @classmethod
+    def middleware(cls, name: str, before: str = 'redirect'):
+        """
+        注册入站管线阶段，默认位于重定向检查之前
+        stage(ctx) 返回 False 时丢弃该事件，ctx 为 core.context.EventContext
+        """
+        def mw_decorator(func: Callable):
+            cls.middlewares.append((name, func, before))
+            return func
+        return mw_decorator
+
+    @staticmethod
+    def moduleOf(func: Callable) -> str:
+        """module.forest.main -> forest"""
+        parts = func.__module__.split('.')
+        if len(parts) >= 2 and parts[0] == 'module':
+            return parts[1]
+        return func.__module__
+
+    @classmethod
+    def gate(cls, moduleName: str, groups: Iterable[int] = ()) -> None:
+        """声明模块按群启用，此后只有启用群中的群事件会分发给该模块"""
+        cls.enabledGroups[moduleName] = set(groups)
+        cls.__listenerCache.clear()
+
+    @classmethod
+    def stateful(cls, moduleName: str) -> None:
+        """声明模块在进程内保存状态，启用该模块时不能分片运行"""
+        cls.statefulModules.add(moduleName)
+
+    @classmethod
+    def enableGroup(cls, moduleName: str, groupId: int) -> None:
+        if moduleName in cls.enabledGroups:
+            cls.enabledGroups[moduleName].add(groupId)
+            cls.__listenerCache.clear()
+
+    @classmethod
+    def disableGroup(cls, moduleName: str, groupId: int) -> None:
+        if moduleName in cls.enabledGroups:
+            cls.enabledGroups[moduleName].discard(groupId)
+            cls.__listenerCache.clear()
+
+    @classmethod
+    def isEnabled(cls, func: Callable, groupId: int) -> bool:
+        groups = cls.enabledGroups.get(cls.handlerModules.get(func))
+        return groups is None or groupId in groups
+
+    @classmethod
+    def groupListeners(cls, eventName: str, groupId: int) -> Tuple[Callable, ...]:
+        """该群中启用的监听者，按 (事件, 群) 缓存"""
+        key = (eventName, groupId)
+        listeners = cls.__listenerCache.get(key)
+        if listeners is None:
+            listeners = tuple(
+                func for func in cls.eventsListener.get(eventName, [])
+                if cls.isEnabled(func, groupId))
+            cls.__listenerCache[key] = listeners
+        return listeners
+
+    @classmethod
+    def modules(cls) -> List[str]:
+        """module 包下已加载的模块名"""
+        return sorted({name for name in cls.handlerModules.values()
+                       if f'module.{name}' in sys.modules})
+
+    @classmethod
+    def reloadable(cls) -> List[str]:
+        """可以重载的模块：已加载的以及清单中导入或加载失败的"""
+        return sorted(set(cls.modules()) | (cls.failures.keys() & set(cls.manifest)))
+
+    @classmethod
+    def unload(cls, moduleName: str) -> None:
+        """撤销模块的全部注册：监听、指令、中间件与按群启用"""
+        def owned(func: Callable) -> bool:
+            return cls.handlerModules.get(func) == moduleName
+
+        for listeners in cls.eventsListener.values():
+            listeners[:] = [func for func in listeners if not owned(func)]
+        for base, commands in ((CommandType.Group, cls.groupCommands),
+                               (CommandType.Contact, cls.contactCommands)):
+            for command in [command for command, func in commands.items() if owned(func)]:
+                del commands[command]
+                for unsubscriber in cls.commandUnsubscribers.get(base, []):
+                    unsubscriber(command)
+        cls.middlewares[:] = [item for item in cls.middlewares
+                              if cls.moduleOf(item[1]) != moduleName]
+        cls.enabledGroups.pop(moduleName, None)
+        cls.statefulModules.discard(moduleName)
+        for func in [func for func in cls.handlerModules if owned(func)]:
+            del cls.handlerModules[func]
+        cls.__listenerCache.clear()
+
+    @classmethod
+    async def emit(cls, eventName: str, app: Any, moduleName: str) -> None:
+        """只向某个模块的监听者触发事件（如 Load、Unload）"""
+        listeners = [func for func in cls.eventsListener.get(eventName, [])
+                     if cls.handlerModules.get(func) == moduleName]
+        await asyncio.gather(*(listener(app) for listener in listeners))
+
+    @staticmethod
+    def __forget(package: str) -> None:
+        """从 sys.modules 中移除包及其子模块，下次导入时重新执行"""
+        for name in [name for name in sys.modules
+                     if name == package or name.startswith(package + '.')]:
+            del sys.modules[name]
+
+    @classmethod
+    def __importModule(cls, package: str, name: str) -> bool:
+        """导入一个模块，失败时撤销其已完成的注册并记录错误"""
+        try:
+            setattr(sys.modules[package], name, importlib.import_module(f'{package}.{name}'))
+        except Exception as e:
+            traceback.print_exc()
+            print(f'模块 {name} 导入失败: ', e)
+            cls.failures[name] = f'{type(e).__name__}: {e}'.splitlines()[0]
+            cls.unload(name)
+            cls.__forget(f'{package}.{name}')
+            return False
+        cls.failures.pop(name, None)
+        return True
+
+    @classmethod
+    def importModules(cls, package: str, names: Iterable[str]) -> None:
+        """逐个导入 package 下的模块并计时，导入失败的模块跳过，不影响其他模块"""
+        for name in names:
+            cls.manifest.append(name)
+            begin = time.perf_counter()
+            cls.__importModule(package, name)
+            cls.profile.setdefault(name, {})['import'] = time.perf_counter() - begin
+
+    @classmethod
+    def defer(cls, moduleName: str) -> None:
+        """声明模块延迟加载，启动时不触发其 Load"""
+        cls.deferred.setdefault(moduleName, None)
+
+    @classmethod
+    async def __timedLoad(cls, app: Any, moduleName: str) -> None:
+        """触发模块的 Load 事件并计时，超时或失败时撤销其注册，修复后可重载"""
+        begin = time.perf_counter()
+        try:
+            await asyncio.wait_for(cls.emit('Load', app, moduleName), cls.loadTimeout)
+        except asyncio.TimeoutError:
+            print(f'模块 {moduleName} 加载超过 {cls.loadTimeout}s，已取消')
+            cls.failures[moduleName] = f'加载超时（{cls.loadTimeout}s）'
+        except Exception as e:
+            traceback.print_exc()
+            print(f'模块 {moduleName} 加载失败: ', e)
+            cls.failures[moduleName] = f'{type(e).__name__}: {e}'.splitlines()[0]
+        else:
+            cls.failures.pop(moduleName, None)
+        cls.profile.setdefault(moduleName, {})['load'] = time.perf_counter() - begin
+
+        if moduleName in cls.failures:
+            # 未加载完成的模块不能继续处理事件，先让它释放已创建的资源
+            try:
+                await cls.emit('Unload', app, moduleName)
+            except Exception as e:
+                print(f'模块 {moduleName} 卸载时出错: ', e)
+            cls.unload(moduleName)
+
+    @classmethod
+    async def loadAll(cls, app: Any, timeout: float = None) -> None:
+        """并发触发延迟加载以外所有模块的 Load 事件，每个模块限时 timeout 秒，完成后打印启动耗时"""
+        cls.loadTimeout = timeout
+        names = {cls.handlerModules[func] for func in cls.eventsListener.get('Load', [])}
+        begin = time.perf_counter()
+        await asyncio.gather(*(cls.__timedLoad(app, name)
+                               for name in sorted(names - cls.deferred.keys())))
+        print(cls.startupReport())
+        print(f'  加载实际用时 {(time.perf_counter() - begin) * 1000:.1f}ms')
+
+    @classmethod
+    async def ensureLoaded(cls, app: Any, moduleName: str) -> None:
+        """延迟加载的模块在此时触发 Load，并发调用只加载一次"""
+        if moduleName not in cls.deferred:
+            return
+        task = cls.deferred[moduleName]
+        if task is None:
+            async def load() -> None:
+                await cls.__timedLoad(app, moduleName)
+                # 加载失败也不再重试，避免每条消息都重复加载
+                cls.deferred.pop(moduleName, None)
+                print(f'模块 {moduleName} 已延迟加载，'
+                      f'用时 {cls.profile[moduleName]["load"] * 1000:.1f}ms')
+            task = cls.deferred[moduleName] = asyncio.ensure_future(load())
+        await asyncio.shield(task)
+
+    @classmethod
+    async def prepare(cls, app: Any, funcs: Iterable[Callable]) -> None:
+        """确保这些处理函数所属的延迟模块已加载"""
+        for moduleName in {cls.handlerModules.get(func) for func in funcs} & cls.deferred.keys():
+            await cls.ensureLoaded(app, moduleName)
+
+    @classmethod
+    def startupReport(cls) -> str:
+        lines = ['模块启动耗时:']
+        totalImport = totalLoad = 0.0
+        for name in sorted(cls.profile.keys() | cls.failures.keys()):
+            times = cls.profile.get(name, {})
+            totalImport += times.get('import', 0.0)
+            totalLoad += times.get('load', 0.0)
+            if 'import' in times:
+                line = f'  {name:<10} 导入 {times["import"] * 1000:8.1f}ms'
+            else:
+                line = f'  {name:<10} 导入 {"-":>8}  '
+            if name in cls.deferred:
+                line += f'  加载 {"延迟":>6}  '
+            elif 'load' in times:
+                line += f'  加载 {times["load"] * 1000:8.1f}ms'
+            else:
+                line += f'  加载 {"-":>8}  '
+            if name in cls.failures:
+                line += f'  失败: {cls.failures[name]}'
+            lines.append(line)
+        lines.append(f'  合计       导入 {totalImport * 1000:8.1f}ms  加载 {totalLoad * 1000:8.1f}ms'
+                     '（加载并发进行）')
+        return '\n'.join(lines)
+
+    @classmethod
+    async def reload(cls, app: Any, moduleName: str) -> None:
+        """
+        热重载 module 包下的一个模块
+        依次触发其 Unload 事件、撤销注册、重新导入并触发其 Load 事件，其他模块不受影响。
+        之前导入或加载失败的模块修复后也可以用此方法重新加载。
+        重新导入或加载失败时撤销其注册并抛出异常，修复后可再次重载。
+        已登记的重定向仍指向旧代码直到失效；中间件在重启后才会进入管线
+        """
+        package = f'module.{moduleName}'
+        loaded = package in sys.modules
+        if not loaded and moduleName not in cls.failures:
+            raise Exception(f'模块 {moduleName} 未加载')
+        # 先编译检查，语法错误时保留旧模块
+        folder = os.path.join(os.path.dirname(sys.modules['module'].__file__), moduleName)
+        for root, _, files in os.walk(folder):
+            for file in files:
+                if file.endswith('.py'):
+                    path = os.path.join(root, file)
+                    with open(path, encoding='utf-8') as f:
+                        compile(f.read(), path, 'exec')
+
+        task = cls.deferred.get(moduleName)
+        if task is not None:
+            await task
+        # 尚未用到的延迟模块不触发 Unload、Load，重载后仍保持延迟
+        untouched = moduleName in cls.deferred
+
+        if loaded and not untouched:
+            await cls.emit('Unload', app, moduleName)
+        cls.unload(moduleName)
+        cls.__forget(package)
+        # 整个包重新导入，子模块按原有的导入顺序重新执行
+        if not cls.__importModule('module', moduleName):
+            raise Exception(f'模块 {moduleName} 导入失败: {cls.failures[moduleName]}')
+        if not untouched:
+            await cls.__timedLoad(app, moduleName)
+            if moduleName in cls.failures:
+                raise Exception(f'模块 {moduleName} 加载失败: {cls.failures[moduleName]}')
+
+
+def installReloadSignal(loop: asyncio.AbstractEventLoop,
+                        reload: Callable[[], Awaitable[Dict[str, str]]]) -> None:
+    """收到 SIGHUP 时调用 reload 重载模块并打印失败的模块（Windows 上没有该信号）"""
+    if not hasattr(signal, 'SIGHUP'):
+        return
+
+    async def handle() -> None:
+        try:
+            failures = await reload()
+        except Exception as e:
+            print('重载模块时出错:', e)
+            return
+        for name, error in failures.items():
+            print(f'模块 {name} 重载失败:', error)
+    loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(handle()))
@@ -1,22 +1,45 @@
 import re
+import asyncio
 import hashlib
-import copy
 
-from typing import List, overload
+from functools import lru_cache
+from typing import Iterator, List, Tuple, overload
 
 from core.extern.message.enums import MessageType
 from core.extern.message.enums import *
 
 
+# 消息段构造后不可修改，只能在构造时经此赋值
+_set = object.__setattr__
+
+
 class BaseMsg:
+    """
+    消息段，构造后不可修改
+    同一原文切分出的消息段被多个消息共享（见 Message.__tokenize），需要不同内容时应构造新的消息段
+    """
+
+    __slots__ = ('type',)
 
     def __init__(self, type: MessageType) -> None:
         self.type: MessageType
 
-        self.type = type
+        _set(self, 'type', type)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f'{type(self).__name__} 不可修改')
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f'{type(self).__name__} 不可修改')
+
+    def __setstate__(self, state: tuple) -> None:
+        # 跨进程传递时按 __slots__ 恢复
+        for name, value in state[1].items():
+            _set(self, name, value)
     
     def getType(self) -> MessageType:
-        return copy.copy(self.type)
+        # 枚举成员本身不可变，无需复制
+        return self.type
     
     def dict() -> dict:
         pass
@@ -24,17 +47,19 @@ class BaseMsg:
 
 class TextMsg(BaseMsg):
 
+    __slots__ = ('text',)
+
     def __init__(self, data: dict = None, text: str = None) -> None:
         self.text: str
 
         super().__init__(MessageType.TextMessage)
         if data is not None and text is None:
             try:
-                self.text = data['text']
+                _set(self, 'text', data['text'])
             except:
                 raise Exception("Text 消息初始化错误 输入: ", data)
         elif data is None and text is not None:
-            self.text = text
+            _set(self, 'text', text)
 
     def __str__(self) -> str:
         return self.text
@@ -48,6 +73,8 @@ class TextMsg(BaseMsg):
 class RefMsg(BaseMsg):
     #target: Member
 
+    __slots__ = ('target', 'display')
+
     def __init__(self, data: dict = None, target: int = None) -> None:
         self.target: int
         self.display: str
@@ -55,12 +82,12 @@ class RefMsg(BaseMsg):
         super().__init__(MessageType.AtMessage)
         if data is not None and target is None:
             try:
-                self.target = int(data['target'])
-                # self.display = data['display']
+                _set(self, 'target', int(data['target']))
+                # _set(self, 'display', data['display'])
             except:
                 raise Exception("At 消息初始化错误 输入: ", data)
         elif data is None and target is not None:
-            self.target = int(target)
+            _set(self, 'target', int(target))
 
     def __str__(self) -> str:
         return f'[YOZ:At,target={self.target}]'
@@ -72,7 +99,9 @@ class RefMsg(BaseMsg):
 
 
 class ImgMsg(BaseMsg):
-    
+
+    __slots__ = ('imageId', 'online', 'url')
+
     def __init__(self, data: dict) -> None:
         self.imageId: str
         self.online: bool
@@ -80,8 +109,8 @@ class ImgMsg(BaseMsg):
 
         super().__init__(MessageType.ImageMessage)
 
-        self.online = False
-        self.imageId = data['imageId']
+        _set(self, 'online', False)
+        _set(self, 'imageId', data['imageId'])
     
     def __str__(self) -> str:
         return f'[YOZ:Image,imageId={self.imageId}]'
@@ -97,11 +126,58 @@ class ImgMsg(BaseMsg):
             }
 
 
+class _Chain(list):
+    """
+    消息链列表，任何修改都会清除所属消息缓存的文本、指纹与序列化结果
+    shared 为真时链被多个消息共享，消息在修改前需先复制（见 Message.msgChain）
+    """
+
+    __slots__ = ('rendered', 'fingerprint', 'serialized', 'shared')
+
+    def __init__(self, iterable=()) -> None:
+        super().__init__(iterable)
+        self.rendered: str = None
+        self.fingerprint: int = None
+        self.serialized: List[dict] = None
+        self.shared: bool = False
+
+    def invalidate(self) -> None:
+        self.rendered = None
+        self.fingerprint = None
+        self.serialized = None
+
+    def fork(self) -> '_Chain':
+        """复制出独占的链，缓存仍然有效，一并带上"""
+        chain = _Chain(self)
+        chain.rendered = self.rendered
+        chain.fingerprint = self.fingerprint
+        chain.serialized = self.serialized
+        return chain
+
+
+def _mutator(name: str):
+    method = getattr(list, name)
+
+    def wrapper(self, *args):
+        self.invalidate()
+        return method(self, *args)
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append',
+              'extend', 'insert', 'pop', 'remove', 'clear', 'sort', 'reverse'):
+    setattr(_Chain, _name, _mutator(_name))
+del _name
+
+
 class Message:
 
     # TODO 在外部实现转换器类 以兼容 Telegram
     # TODO 建议构造输入 mirai 对象的方式，同时将 enums 类移入 mirai 模块
 
+    __slots__ = ('__chain', 'uid', 'delivery')
+
     __TYPE_SOURCE = 'Source'
 
     __CONVERTOR = {
@@ -110,9 +186,12 @@ class Message:
         'Image': ImgMsg
     }
 
+    __CODE = re.compile(rf'\[YOZ:({"|".join(__CONVERTOR)})((?:,[^,\]]*)*)\]')
+
     def __init__(self, chain: List[dict] = None, raw: str = None) -> None:
-        self.msgChain: List[BaseMsg] = []
+        self.__chain: _Chain = _Chain()
         self.uid: int
+        self.delivery: "asyncio.Future[int]" = None
 
         if chain is not None and raw is None:
             self.uid = chain[0]['id']
@@ -122,7 +201,7 @@ class Message:
                     if type == Message.__TYPE_SOURCE:
                         continue
                     if type in Message.__CONVERTOR.keys():
-                        self.msgChain.append(
+                        self.__chain.append(
                             Message.__CONVERTOR[type](data=msgDict))
                 except Exception as e:
                     print('解析消息链时出现问题:\n\t', e)
@@ -130,11 +209,37 @@ class Message:
         elif chain is None and raw is not None:
             self.phraseAppend(raw)
 
+    @property
+    def msgChain(self) -> List[BaseMsg]:
+        chain = self.__chain
+        if chain.shared:
+            # 写时复制：取出的链可能被修改，与其他消息共享时先复制一份；只读时应直接遍历消息
+            chain = self.__chain = chain.fork()
+        return chain
+
+    @msgChain.setter
+    def msgChain(self, chain: List[BaseMsg]) -> None:
+        self.__chain = _Chain(chain)
+
+    def __iter__(self) -> Iterator[BaseMsg]:
+        """只读遍历消息段，不复制共享的消息链"""
+        return iter(self.__chain)
+
     def __str__(self) -> str:
-        msgStr = ''
-        for msg in self.msgChain:
-            msgStr += str(msg)
-        return msgStr
+        chain = self.__chain
+        if chain.rendered is None:
+            chain.rendered = ''.join(map(str, chain))
+        return chain.rendered
+
+    def fingerprint(self) -> int:
+        """
+        消息内容的指纹，内容相同的消息指纹相同，在消息被修改前只计算一次
+        按消息段类型与内容计算，图片以 imageId 区分
+        """
+        chain = self.__chain
+        if chain.fingerprint is None:
+            chain.fingerprint = hash(tuple((msg.type, str(msg)) for msg in chain))
+        return chain.fingerprint
 
     def md5(self) -> str:
         hl = hashlib.md5()
@@ -142,40 +247,67 @@ class Message:
         return hl.hexdigest()
     
     def chain(self) -> List[dict]:
-        chain = []
-        for msg in self.msgChain:
-            msgDict = {}
-            msgDict['type'] = msg.getType().value
-            msgDict.update(msg.dict())
-            chain.append(msgDict)
-        return chain
+        """序列化为 mirai 消息链，结果会被缓存，调用方不应修改"""
+        if self.__chain.serialized is None:
+            chain = []
+            for msg in self.__chain:
+                msgDict = {}
+                msgDict['type'] = msg.getType().value
+                msgDict.update(msg.dict())
+                chain.append(msgDict)
+            self.__chain.serialized = chain
+        return self.__chain.serialized
+
+    def sent(self, delivery: "asyncio.Future[int]") -> 'Message':
+        """
+        加入发送队列后返回给调用方的消息句柄，发送完成后填入 uid，需要等待发送时 await delivery
+        与原消息共享同一条消息链（含缓存），任一方修改消息链时才复制
+        """
+        handle = Message.__new__(Message)
+        self.__chain.shared = True
+        handle.__chain = self.__chain
+        handle.uid = None
+        handle.delivery = delivery
+        delivery.add_done_callback(handle.__delivered)
+        return handle
+
+    def __delivered(self, delivery: "asyncio.Future[int]") -> None:
+        if delivery.cancelled():
+            return
+        if delivery.exception() is not None:
+            print('发送消息失败:', delivery.exception())
+        else:
+            self.uid = delivery.result()
     
     def phraseAppend(self, raw: str) -> None:
-        typeMatch = '|'.join(list(Message.__CONVERTOR.keys()))
-        components = re.split(rf'(\[YOZ:({typeMatch}).*\])', raw)
-
-        skip = False
-
-        for component in components:
-            if len(component) == 0:
-                continue
-            if skip:
-                skip = False
-                continue
-            m = re.match(rf'\[YOZ:({typeMatch}).*\]', component)
-            if m is None:
-                self.msgChain.append(TextMsg(text=component))
-            else:
-                skip = True
-                typeName = m.group(1)
-                properties = dict(re.findall(
-                    r',\s*([^,]+)\s*=\s*([^,\]]+)\s*', component))
-                self.msgChain.append(
-                    Message.__CONVERTOR[typeName](properties))
+        self.msgChain.extend(Message.__tokenize(raw))
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def __tokenize(raw: str) -> Tuple[BaseMsg, ...]:
+        """
+        一次扫描切分文本与 [YOZ:类型,键=值] 码，结果按原文缓存
+        消息段不可修改，可以被多个消息共享
+        """
+        components = []
+        pos = 0
+        for m in Message.__CODE.finditer(raw):
+            if m.start() > pos:
+                components.append(TextMsg(text=raw[pos:m.start()]))
+            properties = {}
+            for item in m.group(2).split(','):
+                key, sep, value = item.partition('=')
+                if sep:
+                    properties[key.strip()] = value.strip()
+            components.append(Message.__CONVERTOR[m.group(1)](properties))
+            pos = m.end()
+        if pos < len(raw):
+            components.append(TextMsg(text=raw[pos:]))
+        return tuple(components)
 
     def getAtCodes(self) -> List[RefMsg]:
         codes = []
-        for msg in self.msgChain:
+        for msg in self.__chain:
             if isinstance(msg, RefMsg):
                 codes.append(msg)
         return codes
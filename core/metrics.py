@@ -0,0 +1,141 @@
+import time
+
+from aiohttp import web
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+
+BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def handlerName(func: Callable) -> str:
+    """module.forest.main.plantCommand -> forest.plantCommand"""
+    module = func.__module__
+    if module.startswith('module.'):
+        module = module[len('module.'):]
+    if module.endswith('.main'):
+        module = module[:-len('.main')]
+    return f'{module}.{func.__qualname__}'
+
+
+class Histogram:
+    """固定分桶的耗时直方图（单位秒）"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (len(BUCKETS) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """以所在分桶的上界估计分位数"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, cnt in enumerate(self.counts):
+            seen += cnt
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float('inf')
+        return float('inf')
+
+
+class Metrics:
+    """
+    处理函数、重定向与出站调用的耗时与错误统计
+    kind 区分类别（command / listener / redirect / http），name 为具体名称
+    """
+
+    def __init__(self) -> None:
+        self.__histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.__errors: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, kind: str, name: str, seconds: float) -> None:
+        histogram = self.__histograms.get((kind, name))
+        if histogram is None:
+            histogram = self.__histograms[(kind, name)] = Histogram()
+        histogram.observe(seconds)
+
+    def error(self, kind: str, name: str) -> None:
+        self.__errors[(kind, name)] = self.__errors.get((kind, name), 0) + 1
+
+    def record(self, kind: str, name: str, seconds: float, ok: bool = True) -> None:
+        self.observe(kind, name, seconds)
+        if not ok:
+            self.error(kind, name)
+
+    async def invoke(self, kind: str, name: str,
+                     func: Callable[..., Awaitable], *args: Any) -> Any:
+        """调用处理函数并记录耗时，异常计数后继续抛出"""
+        start = time.perf_counter()
+        try:
+            return await func(*args)
+        except Exception:
+            self.error(kind, name)
+            raise
+        finally:
+            self.observe(kind, name, time.perf_counter() - start)
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines = [
+            '# HELP yoz_handler_seconds Handler and outbound call latency.',
+            '# TYPE yoz_handler_seconds histogram'
+        ]
+        for (kind, name), histogram in sorted(self.__histograms.items()):
+            labels = f'kind="{kind}",name="{_escape(name)}"'
+            cumulative = 0
+            for bound, cnt in zip(BUCKETS, histogram.counts):
+                cumulative += cnt
+                lines.append(f'yoz_handler_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'yoz_handler_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'yoz_handler_seconds_sum{{{labels}}} {histogram.sum}')
+            lines.append(f'yoz_handler_seconds_count{{{labels}}} {histogram.count}')
+        lines.append('# HELP yoz_handler_errors_total Handler and outbound call errors.')
+        lines.append('# TYPE yoz_handler_errors_total counter')
+        for (kind, name), cnt in sorted(self.__errors.items()):
+            lines.append(f'yoz_handler_errors_total{{kind="{kind}",name="{_escape(name)}"}} {cnt}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, top: int = 10) -> str:
+        """按 p99 排序的耗时最高的若干项，供机器人指令展示"""
+        rows = sorted(self.__histograms.items(),
+                      key=lambda item: item[1].quantile(0.99), reverse=True)[:top]
+        if len(rows) == 0:
+            return '暂无数据'
+        lines = []
+        for (kind, name), histogram in rows:
+            mean = histogram.sum / histogram.count * 1000
+            p99 = histogram.quantile(0.99) * 1000
+            errors = self.__errors.get((kind, name), 0)
+            lines.append(f'[{kind}] {name}  次数{histogram.count}  '
+                         f'均值{mean:.1f}ms  p99≤{p99:.0f}ms  错误{errors}')
+        return '\n'.join(lines)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+metrics = Metrics()
+
+
+async def serve(host: str, port: int) -> web.AppRunner:
+    """在本地端口上提供 /metrics"""
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type='text/plain')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
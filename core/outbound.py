@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Tuple
+
+from core.message import BaseMsg, Message, RefMsg, TextMsg
+
+
+class TokenBucket:
+    """令牌桶，rate 为每秒补充的令牌数，burst 为桶容量"""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate: float = rate
+        self.burst: int = burst
+        self.__tokens: float = burst
+        self.__last: float = time.monotonic()
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.rate)
+        self.__last = now
+
+    def tryAcquire(self) -> bool:
+        self.__refill()
+        if self.__tokens >= 1:
+            self.__tokens -= 1
+            return True
+        return False
+
+    def refillTime(self) -> float:
+        """桶补满还需的时间（秒）"""
+        self.__refill()
+        return (self.burst - self.__tokens) / self.rate
+
+    async def acquire(self) -> None:
+        while not self.tryAcquire():
+            await asyncio.sleep((1 - self.__tokens) / self.rate)
+
+
+class SendQueue:
+    """
+    出站消息队列
+    按目标排队发送，每个目标与全局各有一个令牌桶限速；
+    同一目标排队中的多条短文本回复会合并为一条消息发送：只有一条时立即发送，
+    已有后续消息排队时最多再等待 window 秒收集更多回复；
+    每个目标排队的消息不超过 maxQueued，超出的消息被拒绝
+    """
+
+    def __init__(self, send: Callable[[Hashable, Message], Awaitable[int]],
+                 rate: float, burst: int, globalRate: float, globalBurst: int,
+                 window: float = 0.3, maxLength: int = 300, maxMerge: int = 5,
+                 maxQueued: int = 20) -> None:
+        self.rate: float = rate
+        self.burst: int = burst
+        self.window: float = window
+        self.maxLength: int = maxLength
+        self.maxMerge: int = maxMerge
+        self.maxQueued: int = maxQueued
+        self.__send = send
+        self.__global = TokenBucket(globalRate, globalBurst)
+        self.__buckets: Dict[Hashable, TokenBucket] = {}
+        self.__queues: Dict[Hashable, Deque[Tuple[Message, asyncio.Future]]] = {}
+        # 目标 -> 新消息入队的通知，合并等待时使用
+        self.__arrivals: Dict[Hashable, asyncio.Event] = {}
+        self.__idle: asyncio.Event = None
+
+    def put(self, target: Hashable, message: Message) -> "asyncio.Future[int]":
+        """
+        将消息加入 target 的发送队列，返回值为发送后消息 id 的 future
+        队列已满时 future 以异常结束
+        """
+        future = asyncio.get_event_loop().create_future()
+        if self.__idle is None:
+            self.__idle = asyncio.Event()
+        queue = self.__queues.get(target)
+        if queue is not None and len(queue) >= self.maxQueued:
+            future.set_exception(Exception(f'{target} 的发送队列已满，消息被丢弃'))
+        elif queue is not None:
+            queue.append((message, future))
+            self.__arrivals[target].set()
+        else:
+            self.__queues[target] = deque([(message, future)])
+            self.__arrivals[target] = asyncio.Event()
+            self.__idle.clear()
+            asyncio.ensure_future(self.__drain(target))
+        return future
+
+    async def join(self) -> None:
+        """等待所有排队中的消息发送完毕"""
+        if self.__idle is not None:
+            await self.__idle.wait()
+
+    def __mergeable(self, message: Message) -> bool:
+        if self.window <= 0:
+            return False
+        for msg in message:
+            if not isinstance(msg, (TextMsg, RefMsg)):
+                return False
+        return len(str(message)) <= self.maxLength
+
+    async def __drain(self, target: Hashable) -> None:
+        queue = self.__queues[target]
+        arrival = self.__arrivals[target]
+        bucket = self.__buckets.get(target)
+        if bucket is None:
+            bucket = self.__buckets[target] = TokenBucket(self.rate, self.burst)
+
+        while queue:
+            message, future = queue.popleft()
+            futures = [future]
+            if self.__mergeable(message) and queue:
+                parts = [message]
+                length = len(str(message))
+                deadline = time.monotonic() + self.window
+                while len(parts) < self.maxMerge:
+                    if not queue:
+                        # 队列已取空，在窗口剩余时间内等待后续回复
+                        arrival.clear()
+                        try:
+                            await asyncio.wait_for(arrival.wait(), deadline - time.monotonic())
+                        except asyncio.TimeoutError:
+                            break
+                        continue
+                    nextMessage = queue[0][0]
+                    if not self.__mergeable(nextMessage):
+                        break
+                    length += len(str(nextMessage)) + 1
+                    if length > self.maxLength:
+                        break
+                    parts.append(nextMessage)
+                    futures.append(queue.popleft()[1])
+                if len(parts) > 1:
+                    message = Message.phrase(*self.__join(parts))
+
+            await bucket.acquire()
+            await self.__global.acquire()
+            try:
+                uid = await self.__send(target, message)
+            except Exception as e:
+                for f in futures:
+                    if not f.done():
+                        f.set_exception(e)
+            else:
+                for f in futures:
+                    if not f.done():
+                        f.set_result(uid)
+        del self.__queues[target]
+        del self.__arrivals[target]
+        if not self.__queues:
+            self.__idle.set()
+        asyncio.get_event_loop().call_later(bucket.refillTime(), self.__evict, target)
+
+    def __evict(self, target: Hashable) -> None:
+        # 补满的令牌桶与新建的等价，目标空闲且桶已补满时删除
+        if target in self.__queues:
+            return
+        bucket = self.__buckets.get(target)
+        if bucket is None:
+            return
+        delay = bucket.refillTime()
+        if delay > 0:
+            asyncio.get_event_loop().call_later(delay, self.__evict, target)
+        else:
+            del self.__buckets[target]
+
+    @staticmethod
+    def __join(parts: List[Message]) -> List[BaseMsg]:
+        chain = []
+        for part in parts:
+            if len(chain) != 0:
+                chain.append(TextMsg(text='\n'))
+            chain.extend(part)
+        return chain
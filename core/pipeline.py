@@ -0,0 +1,56 @@
+import time
+
+from typing import Awaitable, Callable, List, Tuple
+
+from core.context import EventContext
+from core.metrics import metrics
+
+
+# 返回 False 时中止后续阶段
+Stage = Callable[[EventContext], Awaitable[bool]]
+
+
+class Pipeline:
+    """
+    入站事件处理管线
+    各阶段按名称注册，启动时编译为扁平的调用序列，运行时记录每个阶段的耗时
+    """
+
+    def __init__(self) -> None:
+        self.__stages: List[Tuple[str, Stage]] = []
+        self.__compiled: Tuple[Tuple[str, Stage], ...] = None
+
+    def register(self, name: str, stage: Stage,
+                 before: str = None, after: str = None) -> None:
+        """注册阶段，默认追加到末尾，也可指定插入到某个已注册阶段之前或之后"""
+        if name in self.names():
+            raise Exception(f"管线阶段 {name} 重复注册")
+        index = len(self.__stages)
+        if before is not None:
+            index = self.names().index(before)
+        elif after is not None:
+            index = self.names().index(after) + 1
+        self.__stages.insert(index, (name, stage))
+        self.__compiled = None
+
+    def remove(self, name: str) -> None:
+        self.__stages = [item for item in self.__stages if item[0] != name]
+        self.__compiled = None
+
+    def names(self) -> List[str]:
+        return [name for name, _ in self.__stages]
+
+    def compile(self) -> None:
+        self.__compiled = tuple(self.__stages)
+
+    async def run(self, ctx: EventContext) -> None:
+        stages = self.__compiled
+        if stages is None:
+            self.compile()
+            stages = self.__compiled
+        for name, stage in stages:
+            start = time.perf_counter()
+            proceed = await stage(ctx)
+            metrics.observe('stage', name, time.perf_counter() - start)
+            if not proceed:
+                return
@@ -0,0 +1,137 @@
+import time
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class Redirector:
+    __slots__ = ('guid', 'hook', 'ttl', 'deadline', 'table', 'key', 'predicate')
+
+    def __init__(self, guid: str, hook: Callable, ttl: float,
+                 table: dict, key: Hashable, predicate: Callable[[dict], bool] = None) -> None:
+        self.guid: str = guid
+        self.hook: Callable = hook
+        self.ttl: float = ttl
+        self.deadline: float = time.monotonic() + ttl if ttl > 0 else None
+        self.table: dict = table
+        self.key: Hashable = key
+        self.predicate: Callable[[dict], bool] = predicate
+
+    def alive(self, now: float) -> bool:
+        return self.deadline is None or now < self.deadline
+
+    def touch(self, now: float) -> None:
+        if self.deadline is not None:
+            self.deadline = now + self.ttl
+
+
+def compileFilter(filter: dict) -> Callable[[dict], bool]:
+    """
+    将过滤条件编译为判断函数
+    键为以 . 分隔的字段路径（如 'sender.group.id'），值可以是：
+        可调用对象  以字段值调用，返回真时匹配
+        集合/列表   字段值在其中时匹配
+        其他        字段值相等时匹配
+    """
+    tests: List[Tuple[Tuple[str, ...], Callable[[Any], bool]]] = []
+    for path, expected in filter.items():
+        keys = tuple(path.split('.'))
+        if callable(expected):
+            test = expected
+        elif isinstance(expected, (set, frozenset, list, tuple)):
+            test = frozenset(expected).__contains__
+        else:
+            # expected.__eq__ 在类型不同时返回 NotImplemented（为真），不能直接使用
+            test = lambda value, expected=expected: value == expected
+        tests.append((keys, test))
+    tests = tuple(tests)
+
+    def predicate(event: dict) -> bool:
+        for keys, test in tests:
+            value = event
+            for key in keys:
+                if not isinstance(value, dict) or key not in value:
+                    return False
+                value = value[key]
+            if not test(value):
+                return False
+        return True
+    return predicate
+
+
+class RedirectRegistry:
+    """
+    消息重定向表
+    群成员与联系人重定向以字典索引，命中检查只需一次字典查询；
+    超过 ttl 秒未被触发的重定向会自动失效
+    """
+
+    def __init__(self, ttl: float = 600) -> None:
+        self.ttl: float = ttl
+        self.__members: Dict[Tuple[int, int], Redirector] = {}
+        self.__contacts: Dict[int, Redirector] = {}
+        self.__filters: Dict[str, Redirector] = {}
+        self.__guids: Dict[str, Redirector] = {}
+
+    def __add(self, redirector: Redirector) -> None:
+        self.remove(redirector.guid)
+        old = redirector.table.get(redirector.key)
+        if old is not None:
+            del self.__guids[old.guid]
+        redirector.table[redirector.key] = redirector
+        self.__guids[redirector.guid] = redirector
+
+    def addMember(self, guid: str, groupId: int, memberId: int,
+                  hook: Callable, ttl: float = None) -> None:
+        self.__add(Redirector(guid, hook, self.ttl if ttl is None else ttl,
+                              self.__members, (groupId, memberId)))
+
+    def addContact(self, guid: str, contactId: int,
+                   hook: Callable, ttl: float = None) -> None:
+        self.__add(Redirector(guid, hook, self.ttl if ttl is None else ttl,
+                              self.__contacts, contactId))
+
+    def add(self, guid: str, filter: dict, hook: Callable, ttl: float = None) -> None:
+        self.__add(Redirector(guid, hook, self.ttl if ttl is None else ttl,
+                              self.__filters, guid, compileFilter(filter)))
+
+    def remove(self, guid: str) -> bool:
+        redirector = self.__guids.pop(guid, None)
+        if redirector is None:
+            return False
+        del redirector.table[redirector.key]
+        return True
+
+    def __hit(self, redirector: Optional[Redirector]) -> Optional[Callable]:
+        if redirector is None:
+            return None
+        now = time.monotonic()
+        if not redirector.alive(now):
+            self.remove(redirector.guid)
+            return None
+        redirector.touch(now)
+        return redirector.hook
+
+    def matchMember(self, groupId: int, memberId: int) -> Optional[Callable]:
+        return self.__hit(self.__members.get((groupId, memberId)))
+
+    def matchContact(self, contactId: int) -> Optional[Callable]:
+        return self.__hit(self.__contacts.get(contactId))
+
+    def match(self, event: dict) -> Optional[Callable]:
+        """按注册顺序检查通用过滤器"""
+        if not self.__filters:
+            return None
+        for redirector in list(self.__filters.values()):
+            if redirector.predicate(event):
+                hook = self.__hit(redirector)
+                if hook is not None:
+                    return hook
+        return None
+
+    def sweep(self) -> int:
+        """清除所有已失效的重定向，返回清除的数量"""
+        now = time.monotonic()
+        expired = [r.guid for r in self.__guids.values() if not r.alive(now)]
+        for guid in expired:
+            self.remove(guid)
+        return len(expired)
@@ -0,0 +1,32 @@
+from typing import Callable, Iterable, Optional, Tuple
+
+from util.trie import Trie
+
+
+class CommandRouter:
+    """
+    指令路由
+    将所有指令头与指令拼接后编入前缀树，每条消息只需一次最长前缀匹配
+    """
+
+    def __init__(self, heads: Iterable[str]) -> None:
+        self.heads: Tuple[str, ...] = tuple(heads)
+        self.__trie = Trie()
+
+    def add(self, command: str, handler: Callable) -> None:
+        for head in self.heads:
+            self.__trie[head + command] = handler
+
+    def remove(self, command: str) -> None:
+        for head in self.heads:
+            try:
+                del self.__trie[head + command]
+            except KeyError:
+                pass
+
+    def match(self, text: str) -> Optional[Tuple[str, Callable]]:
+        """返回 (匹配到的指令头+指令, 处理函数)，无匹配时返回 None"""
+        try:
+            return self.__trie.longest_prefix(text)
+        except KeyError:
+            return None
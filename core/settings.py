@@ -0,0 +1,37 @@
+# 各平台适配器共用的运行配置，平台的 settings 以 from core.settings import * 引入后按需覆盖
+
+# 同时处理中的事件上限；每个会话（群或私聊）排队事件的上限，超出的事件被丢弃；
+# 所有会话排队事件的合计上限，超出后暂停接收新事件
+MAX_INFLIGHT = 64
+MAX_PENDING = 32
+MAX_BACKLOG = 1024
+
+# 平台 HTTP 接口的连接池大小、并发请求上限与超时（秒）
+HTTP_POOL_SIZE = 32
+HTTP_CONCURRENCY = 16
+HTTP_TIMEOUT = 10.0
+
+# 同一会话排队中的短文本回复合并为一条发送，已有回复排队时最多再等待窗口期（秒）收集，窗口为 0 时不合并
+COALESCE_WINDOW = 0.3
+COALESCE_MAX_LENGTH = 300
+COALESCE_MAX_MERGE = 5
+
+# 每个会话排队待发送的消息上限，超出的消息被丢弃
+SEND_QUEUE_SIZE = 20
+
+# 重定向超过该时长（秒）未被触发即失效，以及清理失效重定向的间隔
+REDIRECT_TTL = 10 * 60
+REDIRECT_SWEEP_INTERVAL = 60
+
+# Prometheus 指标端口（/metrics，无鉴权，如 9108），默认为 None 不开启
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = None
+
+# 入站去重窗口（条）与每个发送者的入站限速（条/秒, 突发上限），速率为 None 时不限速
+# 超出速率的消息（包括管理指令）会被直接丢弃，开启前请确认速率足够
+DEDUP_SIZE = 1024
+INBOUND_RATE = None
+INBOUND_BURST = 10
+
+# 单个模块加载（Load 事件）的超时（秒），为 None 时不限
+LOAD_TIMEOUT = 30
@@ -0,0 +1,176 @@
+"""
+入站管线的标准阶段
+事件均为统一后的字典（见 mirai.unify），events 为事件名到核心事件类的映射
+"""
+import asyncio
+
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable
+
+from core.context import EventContext
+from core.loader import Loader
+from core.metrics import handlerName, metrics
+from core.outbound import TokenBucket
+from core.pipeline import Stage
+from core.redirect import RedirectRegistry
+from core.router import CommandRouter
+
+
+def isMessage(response: dict) -> bool:
+    return response['type'][-7:] == 'Message'
+
+
+def buildEvent(ctx: EventContext, events: Dict[str, type]):
+    if ctx.event is None:
+        ctx.event = events[ctx.response['type']](ctx.response)
+        ctx.event.account = ctx.app.account
+    return ctx.event
+
+
+def blacklist(ids: Iterable[int]) -> Stage:
+    ids = frozenset(ids)
+
+    async def stage(ctx: EventContext) -> bool:
+        response = ctx.response
+        return not (isMessage(response) and response['sender']['id'] in ids)
+    return stage
+
+
+def dedup(size: int = 1024, groupOnly: bool = False) -> Stage:
+    """
+    丢弃最近 size 条内重复投递的消息（按会话与消息来源 id 判断）
+    groupOnly 为真时只对群消息去重
+    """
+    seen: "OrderedDict[Hashable, None]" = OrderedDict()
+
+    async def stage(ctx: EventContext) -> bool:
+        response = ctx.response
+        if groupOnly and response['type'] != 'GroupMessage':
+            return True
+        chain = response.get('messageChain')
+        if not chain or chain[0]['type'] != 'Source':
+            return True
+        sender = response['sender']
+        if response['type'] == 'GroupMessage':
+            key = (response['type'], sender['group']['id'], chain[0]['id'])
+        else:
+            # 私聊的消息 id 按会话编号，需带上发送者区分
+            key = (response['type'], sender.get('group', {}).get('id'), sender['id'], chain[0]['id'])
+        if key in seen:
+            seen.move_to_end(key)
+            return False
+        seen[key] = None
+        if len(seen) > size:
+            seen.popitem(last=False)
+        return True
+    return stage
+
+
+def ratelimit(rate: float, burst: int, size: int = 10000) -> Stage:
+    """
+    每个发送者一个令牌桶，超出速率的消息直接丢弃
+    rate 为 None 时不限速，阶段仍然存在以便中间件以其定位
+    """
+    if rate is None:
+        async def passthrough(ctx: EventContext) -> bool:
+            return True
+        return passthrough
+
+    buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+
+    async def stage(ctx: EventContext) -> bool:
+        response = ctx.response
+        if not isMessage(response):
+            return True
+        senderId = response['sender']['id']
+        bucket = buckets.get(senderId)
+        if bucket is None:
+            bucket = buckets[senderId] = TokenBucket(rate, burst)
+            if len(buckets) > size:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(senderId)
+        return bucket.tryAcquire()
+    return stage
+
+
+def redirect(registry: RedirectRegistry, events: Dict[str, type]) -> Stage:
+    async def stage(ctx: EventContext) -> bool:
+        response = ctx.response
+        eventName = response['type']
+        hook = None
+        if eventName == 'GroupMessage':
+            hook = registry.matchMember(
+                response['sender']['group']['id'], response['sender']['id'])
+        elif eventName == 'FriendMessage':
+            hook = registry.matchContact(response['sender']['id'])
+        if hook is None:
+            hook = registry.match(response)
+        if hook is None:
+            return True
+        if eventName in events:
+            e = buildEvent(ctx, events)
+            await metrics.invoke('redirect', handlerName(hook), hook, ctx.app, e)
+        return False
+    return stage
+
+
+def command(routers: Dict[str, CommandRouter], events: Dict[str, type]) -> Stage:
+    """routers 为事件名到指令路由的映射"""
+    async def stage(ctx: EventContext) -> bool:
+        response = ctx.response
+        router = routers.get(response['type'])
+        if router is None:
+            return True
+        try:
+            chain = response['messageChain']
+            if len(chain) < 2 or chain[1]['type'] != 'Plain':
+                return True
+            section1 = chain[1]
+            matched = router.match(section1['text'])
+            if matched is None:
+                return True
+            prefix, activeCommand = matched
+            if Loader.deferred:
+                await Loader.prepare(ctx.app, (activeCommand,))
+                if activeCommand not in Loader.handlerModules:
+                    # 延迟模块加载失败，已撤销注册
+                    return False
+            # 只按群消息所在的群过滤，临时会话转成的私聊不受群启用设置影响
+            if (response['type'] == 'GroupMessage'
+                    and not Loader.isEnabled(activeCommand, response['sender']['group']['id'])):
+                return False
+            # 消息链与原始事件共享，去掉指令时只替换首段
+            chain = list(chain)
+            chain[1] = dict(section1, text=section1['text'][len(prefix):])
+            ctx.response = dict(response, messageChain=chain)
+        except Exception as e:
+            print("指令识别出错: ", e)
+            return False
+        e = buildEvent(ctx, events)
+        await metrics.invoke(
+            'command', handlerName(activeCommand), activeCommand, ctx.app, e)
+        return False
+    return stage
+
+
+def listeners(events: Dict[str, type]) -> Stage:
+    async def stage(ctx: EventContext) -> bool:
+        eventName = ctx.response['type']
+        if eventName not in events:
+            return True
+        if Loader.deferred:
+            await Loader.prepare(ctx.app, Loader.eventsListener.get(eventName, ()))
+        if eventName == 'GroupMessage':
+            # 在构造事件前过滤掉未在该群启用的模块
+            listeners = Loader.groupListeners(eventName, ctx.response['sender']['group']['id'])
+        else:
+            listeners = Loader.eventsListener.get(eventName)
+        if not listeners:
+            return True
+        e = buildEvent(ctx, events)
+        await asyncio.gather(*(
+            metrics.invoke('listener', handlerName(listener), listener, ctx.app, e)
+            for listener in listeners))
+        return True
+    return stage
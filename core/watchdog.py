@@ -0,0 +1,78 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+from types import FrameType
+from typing import Optional, Tuple
+
+from core.metrics import Metrics, metrics
+
+
+class LagWatchdog:
+    """
+    事件循环卡顿检测
+    循环内的心跳协程每 interval 秒更新一次时间戳，独立线程发现心跳停滞超过
+    threshold 秒时，抓取循环线程的调用栈，找出正在执行的处理函数并打印
+    """
+
+    def __init__(self, threshold: float = 0.5, interval: float = 0.1) -> None:
+        self.threshold: float = threshold
+        self.interval: float = interval
+        self.__beat: float = time.monotonic()
+        self.__loopThread: int = None
+        self.__stall: Optional[Tuple[float, str]] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """需在事件循环所在线程中调用"""
+        self.__loopThread = threading.get_ident()
+        self.__beat = time.monotonic()
+        loop.create_task(self.__heartbeat())
+        thread = threading.Thread(target=self.__watch, name='lag-watchdog', daemon=True)
+        thread.start()
+
+    async def __heartbeat(self) -> None:
+        while True:
+            before = time.monotonic()
+            self.__beat = before
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - before - self.interval
+            metrics.observe('loop', 'lag', max(lag, 0.0))
+
+    def __watch(self) -> None:
+        while True:
+            time.sleep(self.interval / 2)
+            stalled = time.monotonic() - self.__beat - self.interval
+            if stalled > self.threshold:
+                if self.__stall is None:
+                    self.__stall = (self.__beat, self.__report(stalled))
+            elif self.__stall is not None:
+                since, handler = self.__stall
+                self.__stall = None
+                duration = self.__beat - since - self.interval
+                print(f'事件循环阻塞结束，共 {duration:.3f}s，处理函数: {handler}')
+
+    def __report(self, stalled: float) -> str:
+        frame = sys._current_frames().get(self.__loopThread)
+        if frame is None:
+            return '未知'
+        handler = self.__locate(frame)
+        print(f'事件循环已阻塞 {stalled:.3f}s，处理函数: {handler}\n'
+              + ''.join(traceback.format_stack(frame)))
+        return handler
+
+    @staticmethod
+    def __locate(frame: FrameType) -> str:
+        """沿调用栈向外查找最近一次 Metrics.invoke，取出处理函数名与事件"""
+        while frame is not None:
+            if frame.f_code is Metrics.invoke.__code__:
+                local = frame.f_locals
+                args = local.get('args', ())
+                event = ''
+                if len(args) >= 2:
+                    event = getattr(args[1], 'type', type(args[1]).__name__)
+                    event = f' 事件 {getattr(event, "value", event)}'
+                return f'[{local.get("kind")}] {local.get("name")}{event}'
+            frame = frame.f_back
+        return '未知（不在处理函数中）'
@@ -1,21 +1,26 @@
 import websockets
 import asyncio
-import json
-import requests
-import pydblite
-import copy
-import inspect
 
 import mirai.settings as s
 import mirai.unify as unify
 
-from typing import Callable, List, Dict
+from typing import List
 
 from mirai.mapping import Mirai2CoreEvents
+from mirai.record import Recorder
 
+from core import stages
 from core.application import App
-from core.loader import Loader
-from core.event import BaseEvent, ContactMessageRecvEvent, GroupMessageRecvEvent
+from core.loader import CommandType, Loader, installReloadSignal
+from core.router import CommandRouter
+from core.dispatcher import Dispatcher
+from core.outbound import SendQueue
+from core.redirect import RedirectRegistry
+from core import context
+from core.metrics import metrics, serve as serveMetrics
+from core.watchdog import LagWatchdog
+from util.httpclient import HttpClient
+from util import codec
 from core.message import Message
 from core.entity.group import Group, Member
 from core.entity.contact import Contact
@@ -27,155 +32,127 @@ os.environ["https_proxy"] = "http://127.0.0.1:8888"
 
 class Mirai(App):
 
-    def __init__(self) -> None:
+    def __init__(self, account: dict = None, recorder: Recorder = None) -> None:
+        """
+        account 可覆盖 settings 中的 BOT_ID、NICKNAME、AUTH_KEY、WS_URL、HTTP_URL，
+        多个账号共用一个进程时传入同一个 recorder
+        """
+        account = account or {}
+        self.account: int = account.get('BOT_ID', s.BOT_ID)
+        self.authKey: str = account.get('AUTH_KEY', s.AUTH_KEY)
+        self.wsUrl: str = account.get('WS_URL', s.WS_URL)
+        self.httpUrl: str = account.get('HTTP_URL', s.HTTP_URL)
         self.commandHead: str = s.CMD_HEAD
         self.sessionKey: str = ''
-        self.redirectors: Dict[str, (str, Callable)] = {}
-        self.memberRedirectors = pydblite.Base(':memory:')
-        self.contactRedirectors = pydblite.Base(':memory:')
-        self.nickname: str = s.NICKNAME
-
-        self.memberRedirectors.create('guid', 'groupId', 'memberId', 'hook')
-        self.contactRedirectors.create('guid', 'contactId', 'hook')
-
-        self.memberRedirectors.create_index('guid', 'groupId', 'memberId')
-        self.contactRedirectors.create_index('guid', 'contactId')
-
-    # 过滤满足filter的消息，并将其完全重定向至hook
-    def redirect(self, guid: str, filter: dict,
-                 hook: Callable[[App, BaseEvent], None]):
-        # 待实现
-        self.redirectors[guid] = (filter, hook)
-
-    # 过滤满足特定群与QQ号的消息，并将其完全重定向至hook
-    def redirectMember(self, guid: str, groupId: int, memberId: int,
-                       hook: Callable[[App, GroupMessageRecvEvent], None]):
-        self.memberRedirectors.insert(
-            guid=guid,
-            groupId=groupId,
-            memberId=memberId,
-            hook=hook
+        self.redirects = RedirectRegistry(s.REDIRECT_TTL)
+        self.watchdog = LagWatchdog(s.LAG_THRESHOLD or 0, s.LAG_INTERVAL)
+        self.recorder: Recorder = recorder
+        if recorder is None and s.RECORD_PATH is not None:
+            self.recorder = Recorder(s.RECORD_PATH)
+        self.nickname: str = account.get('NICKNAME', s.NICKNAME)
+        self.handledEvents = frozenset(
+            list(Mirai2CoreEvents.__members__) + ['TempMessage'])
+
+        self.dispatcher = Dispatcher(s.MAX_INFLIGHT, s.MAX_PENDING, s.MAX_BACKLOG)
+        self.http = HttpClient(
+            self.httpUrl,
+            poolSize=s.HTTP_POOL_SIZE,
+            concurrency=s.HTTP_CONCURRENCY,
+            timeout=s.HTTP_TIMEOUT,
+            observer=metrics.record
         )
-
-    # 过滤满足特定QQ号的消息，并将其完全重定向至hook
-    def redirectContact(self, guid: str, contactId: int,
-                        hook: Callable[[App, ContactMessageRecvEvent], None]):
-        self.contactRedirectors.insert(
-            guid=guid,
-            contactId=contactId,
-            hook=hook
+        self.outbound = SendQueue(
+            self._deliver,
+            rate=s.SEND_RATE,
+            burst=s.SEND_BURST,
+            globalRate=s.SEND_GLOBAL_RATE,
+            globalBurst=s.SEND_GLOBAL_BURST,
+            window=s.COALESCE_WINDOW,
+            maxLength=s.COALESCE_MAX_LENGTH,
+            maxMerge=s.COALESCE_MAX_MERGE,
+            maxQueued=s.SEND_QUEUE_SIZE
         )
 
-    # 卸载hook
-    def unredirect(self, guid: str) -> None:
-        if guid in self.redirectors:
-            del self.redirectors[guid]
-        else:
-            recs = self.contactRedirectors(guid=guid)
-            if len(recs) != 0:
-                del self.contactRedirectors[recs[0]['__id__']]
-            else:
-                recs = self.memberRedirectors(guid=guid)
-                if len(recs) != 0:
-                    del self.memberRedirectors[recs[0]['__id__']]
+        heads = [s.CMD_HEAD] + s.ALT_CMD_HEAD
+        self.groupRouter = CommandRouter(heads)
+        self.contactRouter = CommandRouter(heads)
+        Loader.subscribe(CommandType.Group, self.groupRouter.add, self.groupRouter.remove)
+        Loader.subscribe(CommandType.Contact, self.contactRouter.add, self.contactRouter.remove)
+
+        self.blackList = frozenset(s.BLACK_LIST)
+        self.pipeline = self._build_pipeline(
+            s, {event.name: event.value for event in Mirai2CoreEvents})
 
     async def _message_event_socket(self):
-        try:
-            receiver = await websockets.connect(f'{s.WS_URL}/all?verifyKey={s.AUTH_KEY}&qq={s.BOT_ID}')
-            response = await receiver.recv()
-            response = json.loads(response)
-            self.sessionKey = response['data']['session']
-        except Exception as e:
-            print('Websocket 连接出错:', e)
+        asyncio.ensure_future(self._sweep_redirects(s.REDIRECT_SWEEP_INTERVAL))
+        # 连接失败或断开后重连，间隔从 1 秒起翻倍，最多 60 秒
+        backoff = 1
         while True:
             try:
+                receiver = await websockets.connect(
+                    f'{self.wsUrl}/all?verifyKey={self.authKey}&qq={self.account}')
                 response = await receiver.recv()
-                response = json.loads(response)['data']
+                response = codec.loads(response)
+                self.sessionKey = response['data']['session']
             except Exception as e:
-                print('Websocket 通讯中出错:', e)
-
-            # 初始化 data
-            data: dict = {}
-
-            if response['type'][-7:] == 'Message':
-                if response['sender']['id'] in s.BLACK_LIST:
-                    continue
-
-            # Middleware: temp message filter here
-            if response['type'] == 'TempMessage':
-                data['originGroupId'] = response['sender']['group']['id']
-                response = unify.unifyTemp2FriendEvent(response)
-
-            eventName = response['type']
-
-            # 检查是否满足redirector
-            if eventName == 'GroupMessage':
-                groupId = response['sender']['group']['id']
-                memberId = response['sender']['id']
-                rec = self.memberRedirectors(groupId=groupId, memberId=memberId)
-                if len(rec) != 0:
-                    rec = rec[0]
-                    e = GroupMessageRecvEvent(
-                        unify.unifyEventDict(response))
-                    await rec['hook'](self, e)
-                    continue
-                
-            elif eventName == 'FriendMessage':
-                contactId = response['sender']['id']
-                rec = self.contactRedirectors(contactId=contactId)
-                if len(rec) != 0:
-                    rec = rec[0]
-                    e = ContactMessageRecvEvent(
-                        unify.unifyEventDict(response))
-                    await rec['hook'](self, e)
-                    continue
-            
-            # 尝试匹配指令
-            if eventName == 'GroupMessage' or eventName == 'FriendMessage':
-                # TODO use Trie tree to optimize command match
-                activeCommand: Callable = None
+                print(f'账号 {self.account} Websocket 连接出错，{backoff} 秒后重连:', e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
+            backoff = 1
+            while True:
                 try:
-                    mostMatch = ''
-                    section1 = response['messageChain'][1]
-                    if section1['type'] == 'Plain' \
-                            and (section1['text'][0] == s.CMD_HEAD or section1['text'][0] in s.ALT_CMD_HEAD):
-                        text = section1['text'][1:]
-                        if eventName == 'GroupMessage':
-                            for cmdStr in Loader.groupCommands.keys():
-                                if text[:len(cmdStr)] == cmdStr and len(cmdStr) > len(mostMatch):
-                                    mostMatch = cmdStr
-                            section1['text'] = section1['text'][len(mostMatch)+1:]
-                            e = GroupMessageRecvEvent(
-                                unify.unifyEventDict(response))
-                            if len(mostMatch) != 0:
-                                activeCommand = Loader.groupCommands[mostMatch]
-                        else:
-                            for cmdStr in Loader.contactCommands.keys():
-                                if text[:len(cmdStr)] == cmdStr and len(cmdStr) > len(mostMatch):
-                                    mostMatch = cmdStr
-                            section1['text'] = section1['text'][len(mostMatch)+1:]
-                            e = ContactMessageRecvEvent(
-                                unify.unifyEventDict(response))
-                            if len(mostMatch) != 0:
-                                activeCommand = Loader.contactCommands[mostMatch]
+                    frame = await receiver.recv()
                 except Exception as e:
-                    print("指令识别出错: ", e)
-                    continue
-                if activeCommand is not None:
-                    await activeCommand(self, e)
-                    continue
+                    # 连接断开后 recv 会一直抛出同样的异常，需要重新连接
+                    print(f'账号 {self.account} Websocket 连接断开，重新连接:', e)
+                    await receiver.close()
+                    break
+                if self.recorder is not None:
+                    self.recorder.write(frame)
+                await self._feed(frame)
+
+    async def _feed(self, frame: str) -> None:
+        """处理一帧 websocket 原始数据"""
+        # 先粗略查看类型与发送者，无人处理或黑名单的事件不做完整解析
+        eventName, senderId = codec.peek(frame)
+        if eventName is not None:
+            if eventName not in self.handledEvents:
+                return
+            if eventName[-7:] == 'Message' and senderId in self.blackList:
+                return
 
-            if hasattr(Mirai2CoreEvents, eventName):
-                e = Mirai2CoreEvents[eventName].value(
-                    unify.unifyEventDict(response))
-                listeners = Loader.eventsListener.get(eventName)
+        try:
+            response = codec.loads(frame)['data']
+        except Exception as e:
+            print('Websocket 通讯中出错:', e)
+            return
+
+        if response['type'] not in self.handledEvents:
+            return
+
+        await self._submit(response)
+
+    async def _submit(self, response: dict) -> None:
+        """将解析后的事件交给分发器"""
+        await self.dispatcher.submit(
+            self._conversation_key(response), self._dispatch, response)
 
-                if listeners is not None:
-                    await asyncio.gather(*(listener(self, e) for listener in listeners))
+    async def _dispatch(self, response: dict) -> None:
+        originGroupId = None
+
+        # Middleware: temp message filter here
+        if response['type'] == 'TempMessage':
+            originGroupId = response['sender']['group']['id']
+            response = unify.unifyTemp2FriendEvent(response)
+
+        # 每个事件只统一一次，后续直接使用统一后的视图
+        response = unify.unifyEventDict(response)
+
+        await super()._dispatch(response, originGroupId)
 
     async def _init_modules(self) -> None:
-        listeners = Loader.eventsListener.get('Load')
-        await asyncio.gather(*(listener(self) for listener in listeners))
+        await Loader.loadAll(self, s.LOAD_TIMEOUT)
 
     def run(self):
         """
@@ -202,29 +179,37 @@ class Mirai(App):
             print("认证 session 时发生错误: ", e)
         """
 
-        # init modules
-        asyncio.get_event_loop().run_until_complete(self._init_modules())
-
-        asyncio.get_event_loop().run_until_complete(self._message_event_socket())
+        MiraiHost([self]).run()
 
     def setCommandHead(self, head: str) -> None:
         self.commandHead = head
 
-    def sendGroupMessage(self, group: int, message) -> Message:
+    async def sendGroupMessage(self, group: int, message) -> Message:
         if not isinstance(message, Message):
             message = Message(raw=message)
         message: Message
+        return message.sent(self.outbound.put(('group', group), message))
+
+    async def _deliver(self, target: tuple, message: Message) -> int:
+        """由出站队列调用，真正向 mirai 发送消息并返回消息 id"""
         fMsg = {
             "sessionKey": self.sessionKey,
-            "target": group,
             "messageChain": message.chain()
         }
-        resp = requests.post(f'{s.HTTP_URL}/sendGroupMessage', json=fMsg).json()
-        message = copy.deepcopy(message)
-        message.uid = resp['messageId']
-        return message
+        kind = target[0]
+        if kind == 'group':
+            fMsg['target'] = target[1]
+            resp = await self.http.post('sendGroupMessage', fMsg)
+        elif kind == 'temp':
+            fMsg['qq'] = target[1]
+            fMsg['group'] = target[2]
+            resp = await self.http.post('sendTempMessage', fMsg)
+        else:
+            fMsg['target'] = target[1]
+            resp = await self.http.post('sendFriendMessage', fMsg)
+        return resp['messageId']
 
-    def setSpecialTitle(self, group: int, id: int, title: str) -> None:
+    async def setSpecialTitle(self, group: int, id: int, title: str) -> None:
         fMsg = {
             "sessionKey": self.sessionKey,
             "target": group,
@@ -233,103 +218,75 @@ class Mirai(App):
                 "specialTitle": title
             }
         }
-        requests.post(f'{s.HTTP_URL}/memberInfo', json=fMsg)
+        await self.http.post('memberInfo', fMsg)
 
-    def mute(self, group: int, id: int, time: int) -> None:
+    async def mute(self, group: int, id: int, time: int) -> None:
         fMsg = {
             "sessionKey": self.sessionKey,
             "target": group,
             "memberId": id,
             "time": time
         }
-        requests.post(f'{s.HTTP_URL}/mute', json=fMsg)
+        await self.http.post('mute', fMsg)
 
-    def unmute(self, group: int, id: int) -> None:
+    async def unmute(self, group: int, id: int) -> None:
         fMsg = {
             "sessionKey": self.sessionKey,
             "target": group,
             "memberId": id
         }
-        requests.post(f'{s.HTTP_URL}/unmute', json=fMsg)
+        await self.http.post('unmute', fMsg)
 
-    def muteAll(self, group: int) -> None:
+    async def muteAll(self, group: int) -> None:
         fMsg = {
             "sessionKey": self.sessionKey,
             "target": group
         }
-        requests.post(f'{s.HTTP_URL}/muteAll', json=fMsg)
+        await self.http.post('muteAll', fMsg)
 
-    def unmuteAll(self, group: int) -> None:
+    async def unmuteAll(self, group: int) -> None:
         fMsg = {
             "sessionKey": self.sessionKey,
             "target": group
         }
-        requests.post(f'{s.HTTP_URL}/unmuteAll', json=fMsg)
+        await self.http.post('unmuteAll', fMsg)
 
     # TODO 临时消息尚无模型，建议tg接口中的临时消息接口直接调用sendContactMessage，mirai接口中分别实现。
-    def sendContactMessage(self, contact: int, message, group: int=None) -> Message:
+    async def sendContactMessage(self, contact: int, message, group: int=None) -> Message:
         if not isinstance(message, Message):
             message = Message(raw=message)
         message: Message
-        fMsg = {
-            "sessionKey": self.sessionKey,
-            "messageChain": message.chain()
-        }
-
         if group is not None:
-            fMsg['group'] = group
-            fMsg['qq'] = contact
-            resp = requests.post(f'{s.HTTP_URL}/sendTempMessage', json=fMsg).json()
+            target = ('temp', contact, group)
         else:
-            temp = False
-            for frameInfo in inspect.stack(0):
-                if frameInfo.function == self._message_event_socket.__name__\
-                and isinstance(frameInfo.frame.f_locals['self'], Mirai):
-                    data = frameInfo.frame.f_locals['data']
-                    if 'originGroupId' in data:
-                        groupId = data['originGroupId']
-                        temp = True
-                    break
-            if temp:
-                fMsg['group'] = groupId
-                fMsg['qq'] = contact
-                resp = requests.post(f'{s.HTTP_URL}/sendTempMessage', json=fMsg).json()
+            # 在临时会话中回复时沿用来源群
+            ctx = context.current()
+            if ctx is not None and ctx.temp:
+                target = ('temp', contact, ctx.originGroupId)
             else:
-                fMsg['target'] = contact
-                resp = requests.post(f'{s.HTTP_URL}/sendFriendMessage', json=fMsg).json()
-        message = copy.deepcopy(message)
-        message.uid = resp['messageId']
-        return message
+                target = ('friend', contact)
+        return message.sent(self.outbound.put(target, message))
 
-    def replyContactMessage(self, sender: Contact, message) -> Message:
+    async def replyContactMessage(self, sender: Contact, message) -> Message:
         if not isinstance(message, Message):
             message = Message(raw=message)
         message: Message
-        fMsg = {
-            "sessionKey": self.sessionKey,
-            "messageChain": message.chain()
-        }
         if sender.fromGroup is not None:
-            fMsg['group'] = sender.fromGroup
-            fMsg['qq'] = sender.id
-            resp = requests.post(f'{s.HTTP_URL}/sendTempMessage', json=fMsg).json()
+            target = ('temp', sender.id, sender.fromGroup)
         else:
-            fMsg['target'] = sender.id
-            resp = requests.post(f'{s.HTTP_URL}/sendFriendMessage', json=fMsg).json()
-        message = copy.deepcopy(message)
-        message.uid = resp['messageId']
-        return message  
+            target = ('friend', sender.id)
+        return message.sent(self.outbound.put(target, message))
 
-    def recall(self, messageId: int) -> None:
+    async def recall(self, messageId: int) -> None:
         """撤回消息"""
         fMsg = {
             "sessionKey": self.sessionKey,
             "target": messageId
         }
-        requests.post(f'{s.HTTP_URL}/recall', json=fMsg)
+        await self.http.post('recall', fMsg)
 
     # /sendImageMessage 不返回信息id
-    def sendWebImage(self, urls: List[str], contactId: int=None, groupId: int=None) -> None:
+    async def sendWebImage(self, urls: List[str], contactId: int=None, groupId: int=None) -> None:
         """
         发送URL图片 
         仅传入contantId:    好友消息
@@ -359,19 +316,61 @@ class Mirai(App):
                 "group": groupId,
                 "urls": urls
             }
-        requests.post(f'{s.HTTP_URL}/sendImageMessage', json=fMsg)
+        await self.http.post('sendImageMessage', fMsg)
 
-    def getContactList(self) -> List[Contact]:
+    async def getContactList(self) -> List[Contact]:
         pass
 
-    def getGroupList(self) -> List[Group]:
+    async def getGroupList(self) -> List[Group]:
         pass
 
-    def getMemberList(self, group: int) -> List[Member]:
+    async def getMemberList(self, group: int) -> List[Member]:
         pass
 
-    def kick(self, group: int, target: int, msg: str) -> None:
+    async def kick(self, group: int, target: int, msg: str) -> None:
         pass
 
-    def quit(self, group: int) -> None:
-        pass
\ No newline at end of file
+    async def quit(self, group: int) -> None:
+        pass
+
+class MiraiHost:
+    """
+    在同一进程、同一事件循环中运行一个或多个账号
+    各账号有独立的 websocket、会话、出站队列与重定向表，模块及其配置、数据只加载一次；
+    多个账号在同一群中时，每条群消息只由最先收到它的账号处理
+    """
+
+    def __init__(self, apps: List[Mirai]) -> None:
+        self.apps: List[Mirai] = apps
+        if len(apps) > 1:
+            # 模块状态按群保存，同一条群消息经多个账号重复处理会重复复读、种树与回复
+            shared = stages.dedup(s.DEDUP_SIZE, groupOnly=True)
+            for app in apps:
+                app.pipeline.register('hostdedup', shared, after='dedup')
+                app.pipeline.compile()
+
+    @classmethod
+    def fromSettings(cls) -> 'MiraiHost':
+        if len(s.ACCOUNTS) == 0:
+            return cls([Mirai()])
+        recorder = Recorder(s.RECORD_PATH) if s.RECORD_PATH is not None else None
+        return cls([Mirai(account, recorder) for account in s.ACCOUNTS])
+
+    def run(self):
+        primary = self.apps[0]
+        loop = asyncio.get_event_loop()
+        if s.LAG_THRESHOLD is not None:
+            primary.watchdog.start(loop)
+        installReloadSignal(loop, lambda: primary.reloadModules(Loader.reloadable()))
+        try:
+            # 模块共享，Load 事件只以第一个账号触发一次
+            loop.run_until_complete(primary._init_modules())
+            if s.METRICS_PORT is not None:
+                loop.run_until_complete(serveMetrics(s.METRICS_HOST, s.METRICS_PORT))
+            loop.run_until_complete(asyncio.gather(
+                *(app._message_event_socket() for app in self.apps)))
+        finally:
+            for app in self.apps:
+                loop.run_until_complete(app.http.close())
+            for recorder in {app.recorder for app in self.apps if app.recorder is not None}:
+                recorder.close()
@@ -0,0 +1,34 @@
+import gzip
+import time
+
+from typing import Iterator, Tuple
+
+
+class Recorder:
+    """
+    将收到的 websocket 原始帧连同时间戳写入 gzip 文件
+    每行一帧，格式为 "时间戳\\t帧"
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.__file = gzip.open(path, 'at', encoding='utf-8')
+
+    def write(self, frame: str) -> None:
+        # JSON 字符串内的换行必然已被转义，帧中的原始换行只可能是空白
+        frame = frame.replace('\r', ' ').replace('\n', ' ')
+        self.__file.write(f'{time.time():.6f}\t{frame}\n')
+
+    def close(self) -> None:
+        self.__file.close()
+
+
+def readRecording(path: str) -> Iterator[Tuple[float, str]]:
+    """按顺序读出录制文件中的 (时间戳, 帧)"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if len(line) == 0:
+                continue
+            timestamp, frame = line.split('\t', 1)
+            yield float(timestamp), frame
@@ -1,3 +1,6 @@
+# 通用的运行配置见 core/settings.py，在本文件中重新赋值即可覆盖
+from core.settings import *
+
 HOST = 'localhost'
 PORT = 8089
 AUTH_KEY = 'zJdAWmCXz92DAW3vT'
@@ -14,4 +17,27 @@ ALT_CMD_HEAD = ['。', '#', '/']
 BLACK_LIST = [
     1713688770,
     1252361674
-]
\ No newline at end of file
+]
+
+# 同一进程中运行的多个账号，为空时只运行上面的 BOT_ID；不能与 WORKERS 同时使用
+# 每项可覆盖 BOT_ID、NICKNAME、AUTH_KEY、WS_URL、HTTP_URL，如
+# [{'BOT_ID': 1516161873}, {'BOT_ID': 123456789, 'NICKNAME': '狗狗'}]
+ACCOUNTS = []
+
+# 工作进程数，大于 1 时由一个进程读取 websocket 并统一发送消息，
+# 事件按群号（私聊按 QQ 号）分发给各工作进程，每个工作进程加载全部模块；
+# 启用了在进程内保存状态的模块（如 forest）时不能分片运行
+WORKERS = 0
+
+# 出站限速：每个会话与全局的令牌桶（条/秒, 突发上限）
+SEND_RATE = 1.0
+SEND_BURST = 5
+SEND_GLOBAL_RATE = 5.0
+SEND_GLOBAL_BURST = 20
+
+# 录制 websocket 原始帧的文件路径（gzip），为 None 时不录制，录制文件可用 bench/replay.py 回放
+RECORD_PATH = None
+
+# 事件循环卡顿超过该时长（秒）时打印正在执行的处理函数及调用栈，为 None 时不检测
+LAG_THRESHOLD = 0.5
+LAG_INTERVAL = 0.1
@@ -0,0 +1,369 @@
+"""
+多进程分片运行
+一个读取进程持有 websocket 与出站发送队列，按群号（私聊按 QQ 号）将事件分发给
+WORKERS 个工作进程；工作进程各自加载全部模块，平台调用经管道交回读取进程执行。
+同一群的事件始终由同一工作进程处理，群内顺序与单进程时一致
+"""
+import asyncio
+import itertools
+import multiprocessing
+import threading
+import time
+
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+import mirai.settings as s
+
+from mirai.application import Mirai
+from core.loader import Loader, installReloadSignal
+from core.message import Message
+from core.metrics import serve as serveMetrics
+
+
+class Channel:
+    """
+    管道的异步封装
+    接收在独立线程中阻塞进行，收到的对象转交事件循环中的 handler；对端关闭时 handler 收到 None
+    """
+
+    def __init__(self, conn: Connection, handler: Callable[[Any], None]) -> None:
+        self.conn: Connection = conn
+        self.handler = handler
+        self.__calls = itertools.count(1)
+        self.__pending: Dict[int, asyncio.Future] = {}
+        self.closed: bool = False
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        thread = threading.Thread(target=self.__pump, args=(loop,), name='shard-channel', daemon=True)
+        thread.start()
+
+    def __pump(self, loop: asyncio.AbstractEventLoop) -> None:
+        while True:
+            try:
+                obj = self.conn.recv()
+            except (EOFError, OSError):
+                loop.call_soon_threadsafe(self.__receive, None)
+                return
+            loop.call_soon_threadsafe(self.__receive, obj)
+
+    def __receive(self, obj: Any) -> None:
+        if obj is None:
+            # 对端已关闭，等待中的调用不会再有应答
+            self.closed = True
+            for future in self.__pending.values():
+                if not future.done():
+                    future.set_exception(Exception('管道已关闭'))
+            self.__pending.clear()
+        elif obj[0] == 'result':
+            _, callId, value, error = obj
+            future = self.__pending.pop(callId, None)
+            if future is not None and not future.done():
+                if error is not None:
+                    future.set_exception(Exception(error))
+                else:
+                    future.set_result(value)
+            return
+        self.handler(obj)
+
+    def send(self, *message: Any) -> None:
+        if self.closed:
+            # 对端已关闭，丢弃
+            return
+        self.conn.send(message)
+
+    def call(self, kind: str, *args: Any) -> "asyncio.Future":
+        """发起一次远程调用，对端以 reply() 应答"""
+        callId = next(self.__calls)
+        future = asyncio.get_event_loop().create_future()
+        if self.closed:
+            future.set_exception(Exception('管道已关闭'))
+            return future
+        self.__pending[callId] = future
+        self.send(kind, callId, *args)
+        return future
+
+    def reply(self, callId: int, value: Any = None, error: str = None) -> None:
+        self.send('result', callId, value, error)
+
+
+class _ProxyClient:
+    """代替 HttpClient，请求交由读取进程发出"""
+
+    def __init__(self, channel: Channel) -> None:
+        self.__channel = channel
+
+    async def post(self, api: str, payload: Dict[str, Any]) -> dict:
+        return await self.__channel.call('post', api, payload)
+
+    async def get(self, api: str, params: Dict[str, Any] = None) -> dict:
+        return await self.__channel.call('get', api, params)
+
+    async def close(self) -> None:
+        pass
+
+
+class _ProxyQueue:
+    """代替 SendQueue，消息交由读取进程的出站队列统一限速、合并与发送"""
+
+    def __init__(self, channel: Channel) -> None:
+        self.__channel = channel
+
+    def put(self, target: Hashable, message: Message) -> "asyncio.Future[int]":
+        return self.__channel.call('send', target, message)
+
+    async def join(self) -> None:
+        pass
+
+
+class ShardWorker(Mirai):
+    """工作进程：不连接 websocket，从管道接收事件并运行全部模块"""
+
+    def __init__(self, index: int, conn: Connection) -> None:
+        super().__init__()
+        self.index: int = index
+        self.channel = Channel(conn, self.__receive)
+        self.http = _ProxyClient(self.channel)
+        self.outbound = _ProxyQueue(self.channel)
+        self.__inbox: asyncio.Queue = None
+        self.__closed: asyncio.Future = None
+        # 临时会话与私聊重定向固定到本进程，guid -> QQ 号
+        self.__pinned: Dict[str, int] = {}
+
+    def redirectContact(self, guid: str, contactId: int, hook: Callable, ttl: float = None):
+        super().redirectContact(guid, contactId, hook, ttl)
+        self.__pinned[guid] = contactId
+        self.channel.send('pin', contactId)
+
+    def unredirect(self, guid: str) -> None:
+        super().unredirect(guid)
+        contactId = self.__pinned.pop(guid, None)
+        if contactId is not None:
+            self.channel.send('unpin', contactId)
+
+    async def reloadModules(self, names: List[str]) -> Dict[str, str]:
+        """经读取进程让所有工作进程各自重载，返回各工作进程中重载失败的模块"""
+        return await self.channel.call('reload', names)
+
+    async def __reload(self, callId: int, names: List[str]) -> None:
+        failures = await Mirai.reloadModules(self, names or Loader.reloadable())
+        for name, error in failures.items():
+            print(f'工作进程 {self.index} 重载模块 {name} 失败:', error)
+        self.channel.reply(callId, failures)
+
+    def __receive(self, obj: Any) -> None:
+        if obj is None:
+            if not self.__closed.done():
+                self.__closed.set_result(None)
+        elif obj[0] == 'event':
+            self.__inbox.put_nowait(obj[1])
+        elif obj[0] == 'reload':
+            asyncio.ensure_future(self.__reload(obj[1], obj[2]))
+
+    async def __consume(self) -> None:
+        while True:
+            response = await self.__inbox.get()
+            accepted = await self.dispatcher.submit(
+                self._conversation_key(response), self.__dispatchShard, response)
+            if not accepted:
+                self.channel.send('done')
+
+    async def __dispatchShard(self, response: dict) -> None:
+        try:
+            await self._dispatch(response)
+        finally:
+            self.channel.send('done')
+
+    def run(self):
+        loop = asyncio.get_event_loop()
+        self.__inbox = asyncio.Queue()
+        self.__closed = loop.create_future()
+        if s.LAG_THRESHOLD is not None:
+            self.watchdog.start(loop)
+        self.channel.start(loop)
+        # 模块加载完成前收到的事件留在队列中
+        loop.run_until_complete(self._init_modules())
+        print(f'工作进程 {self.index} 已就绪')
+        asyncio.ensure_future(self.__consume())
+        asyncio.ensure_future(self._sweep_redirects(s.REDIRECT_SWEEP_INTERVAL))
+        loop.run_until_complete(self.__closed)
+
+
+# 工作进程启动后不到该时长（秒）即退出时视为无法启动，读取进程随之停止，不再重启
+WORKER_MIN_UPTIME = 10
+
+
+def _workerMain(index: int, conn: Connection) -> None:
+    # 录制由读取进程负责
+    s.RECORD_PATH = None
+    ShardWorker(index, conn).run()
+
+
+class ShardReader(Mirai):
+    """
+    读取进程：持有 websocket、HTTP 连接池与出站队列，不运行模块
+    工作进程退出时重新启动，已交给它的事件丢失
+    """
+
+    def __init__(self, workers: int) -> None:
+        if s.ACCOUNTS:
+            raise Exception('分片运行只支持 BOT_ID 一个账号，请清空 ACCOUNTS 或将 WORKERS 设为 0')
+        # 每个工作进程都会加载全部模块，进程内保存状态的模块会被重复运行并互相覆盖数据
+        stateful = sorted(Loader.statefulModules & set(Loader.modules()))
+        if stateful:
+            raise Exception(f"模块 {', '.join(stateful)} 在进程内保存状态，不能分片运行，"
+                            "请将 WORKERS 设为 0 或在 config/modules.yml 中停用这些模块")
+        super().__init__()
+        self.workers: int = workers
+        self.processes: List[multiprocessing.Process] = []
+        self.channels: List[Channel] = []
+        self.__credits: List[asyncio.Semaphore] = []
+        self.__started: List[float] = []
+        # 注册了私聊重定向的 QQ 号 -> 工作进程
+        self.__pins: Dict[int, int] = {}
+        self.__loop: asyncio.AbstractEventLoop = None
+        # 工作进程无法启动时以异常结束，停止读取进程
+        self.__fatal: asyncio.Future = None
+
+    def _shard(self, response: dict) -> int:
+        sender = response.get('sender', {})
+        if response['type'] == 'GroupMessage':
+            return sender['group']['id'] % self.workers
+        senderId = sender.get('id', 0)
+        index = self.__pins.get(senderId)
+        if index is not None:
+            return index
+        return senderId % self.workers
+
+    async def _submit(self, response: dict) -> None:
+        index = self._shard(response)
+        # 每个工作进程未完成的事件不超过 MAX_BACKLOG，满时暂停读取 websocket
+        while True:
+            credits = self.__credits[index]
+            await credits.acquire()
+            # 等待期间工作进程可能已重启，需改用新进程的额度
+            if credits is self.__credits[index]:
+                break
+        try:
+            self.channels[index].send('event', response)
+        except OSError as e:
+            # 工作进程刚刚退出，尚未收到管道关闭
+            credits.release()
+            print(f'向工作进程 {index} 转发事件失败:', e)
+
+    def __handler(self, index: int) -> Callable[[Any], None]:
+        def handler(obj: Any) -> None:
+            if obj is None:
+                self.__restart(index)
+                return
+            kind = obj[0]
+            if kind == 'done':
+                self.__credits[index].release()
+            elif kind == 'pin':
+                self.__pins[obj[1]] = index
+            elif kind == 'unpin':
+                if self.__pins.get(obj[1]) == index:
+                    del self.__pins[obj[1]]
+            elif kind == 'reload':
+                asyncio.ensure_future(self.__reloadFor(self.channels[index], obj[1], obj[2]))
+            else:
+                asyncio.ensure_future(self.__call(self.channels[index], obj))
+        return handler
+
+    def __restart(self, index: int) -> None:
+        uptime = time.monotonic() - self.__started[index]
+        print(f'工作进程 {index} 已退出')
+        # 已交给该进程的事件不会再有 done，换用新的额度，并唤醒等待旧额度的读取
+        credits = self.__credits[index]
+        self.__credits[index] = asyncio.Semaphore(s.MAX_BACKLOG)
+        for _ in range(s.MAX_BACKLOG):
+            credits.release()
+        # 私聊重定向随进程一起丢失
+        self.__pins = {qq: i for qq, i in self.__pins.items() if i != index}
+        if uptime < WORKER_MIN_UPTIME:
+            if not self.__fatal.done():
+                self.__fatal.set_exception(
+                    Exception(f'工作进程 {index} 启动 {uptime:.1f} 秒后即退出，停止运行'))
+            return
+        print(f'重新启动工作进程 {index}')
+        self.__spawn(index)
+
+    async def __call(self, channel: Channel, obj: Tuple) -> None:
+        kind, callId = obj[0], obj[1]
+        try:
+            if kind == 'send':
+                value = await self.outbound.put(obj[2], obj[3])
+            elif kind == 'post':
+                value = await self.http.post(obj[2], self.__withSession(obj[3]))
+            elif kind == 'get':
+                value = await self.http.get(obj[2], self.__withSession(obj[3]))
+            else:
+                raise Exception(f'未知的调用 {kind}')
+        except Exception as e:
+            channel.reply(callId, error=f'{type(e).__name__}: {e}')
+        else:
+            channel.reply(callId, value)
+
+    async def reloadWorkers(self, names: List[str] = None) -> Dict[str, str]:
+        """让所有工作进程重载模块，names 为 None 时重载全部，返回各工作进程中重载失败的模块"""
+        results = await asyncio.gather(
+            *(channel.call('reload', names) for channel in self.channels), return_exceptions=True)
+        failures = {}
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                failures[f'工作进程 {index}'] = str(result)
+                continue
+            for name, error in result.items():
+                failures[f'{name}（工作进程 {index}）'] = error
+        return failures
+
+    async def __reloadFor(self, channel: Channel, callId: int, names: List[str]) -> None:
+        # 由某个工作进程的管理指令发起，结果交回该工作进程
+        channel.reply(callId, await self.reloadWorkers(names))
+
+    def __withSession(self, payload: dict) -> dict:
+        # 工作进程不持有会话，由读取进程填入
+        if payload is not None and 'sessionKey' in payload:
+            payload['sessionKey'] = self.sessionKey
+        return payload
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.__loop = loop
+        self.__fatal = loop.create_future()
+        self.processes = [None] * self.workers
+        self.channels = [None] * self.workers
+        self.__credits = [asyncio.Semaphore(s.MAX_BACKLOG) for _ in range(self.workers)]
+        self.__started = [0.0] * self.workers
+        for index in range(self.workers):
+            self.__spawn(index)
+
+    def __spawn(self, index: int) -> None:
+        # spawn 启动的工作进程会重新导入模块，不继承读取进程中的线程与文件
+        ctx = multiprocessing.get_context('spawn')
+        parent, child = ctx.Pipe()
+        process = ctx.Process(target=_workerMain, args=(index, child),
+                              name=f'yoz-worker-{index}', daemon=True)
+        process.start()
+        child.close()
+        channel = Channel(parent, self.__handler(index))
+        channel.start(self.__loop)
+        self.processes[index] = process
+        self.channels[index] = channel
+        self.__started[index] = time.monotonic()
+
+    def run(self):
+        loop = asyncio.get_event_loop()
+        if s.LAG_THRESHOLD is not None:
+            self.watchdog.start(loop)
+        self.start(loop)
+        installReloadSignal(loop, self.reloadWorkers)
+        try:
+            if s.METRICS_PORT is not None:
+                loop.run_until_complete(serveMetrics(s.METRICS_HOST, s.METRICS_PORT))
+            loop.run_until_complete(asyncio.gather(self._message_event_socket(), self.__fatal))
+        finally:
+            loop.run_until_complete(self.http.close())
+            if self.recorder is not None:
+                self.recorder.close()
+            for process in self.processes:
+                process.terminate()
@@ -1,7 +1,6 @@
 
 from typing import Any, Callable, List
 from core.message import Message
-from copy import deepcopy
 
 
 __PERMISSION_MAP = {
@@ -13,17 +12,23 @@ __PERMISSION_MAP = {
 
 
 def unifyEventDict(event_dict: dict) -> dict:
-    event_dict = deepcopy(event_dict)
-    if 'sender' in event_dict:
-        sender = event_dict['sender']
-        if 'permission' in sender:
-            event_dict['sender']['permission'] = \
-                __PERMISSION_MAP[sender['permission'].upper()]
-        if 'group' in sender:
-            group = sender['group']
-            if 'permission' in group:
-                event_dict['sender']['group']['permission'] = \
-                    __PERMISSION_MAP[group['permission'].upper()]
+    """
+    统一权限字段，只复制被改写的 sender 与 sender.group 两层字典，
+    消息链等其余字段与原事件共享
+    """
+    if 'sender' not in event_dict:
+        return event_dict
+    event_dict = dict(event_dict)
+    sender = event_dict['sender'] = dict(event_dict['sender'])
+    if 'permission' in sender:
+        sender['permission'] = \
+            __PERMISSION_MAP[sender['permission'].upper()]
+    if 'group' in sender:
+        group = sender['group']
+        if 'permission' in group:
+            group = sender['group'] = dict(group)
+            group['permission'] = \
+                __PERMISSION_MAP[group['permission'].upper()]
     return event_dict
 
 
@@ -32,10 +37,10 @@ def unifyMessage2Chain(message: Message) -> List[dict]:
 
 
 def unifyTemp2FriendEvent(event_dict: dict) -> dict:
-    event_dict = deepcopy(event_dict)
+    event_dict = dict(event_dict)
     event_dict['type'] = 'FriendMessage'
-    event_dict['sender']['nickname'] = event_dict['sender']['memberName']
-    event_dict['sender']['remark'] = ''
-    del event_dict['sender']['memberName']
-    del event_dict['sender']['permission']
+    sender = event_dict['sender'] = dict(event_dict['sender'])
+    sender['nickname'] = sender.pop('memberName')
+    sender['remark'] = ''
+    del sender['permission']
     return event_dict
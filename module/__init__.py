@@ -1,6 +1,44 @@
-from . import (
-    forest,
-    repeater,
-    revolver,
-    search
-)
\ No newline at end of file
+"""
+模块清单
+启动时只导入 config/modules.yml 中列出的模块，文件不存在时使用默认清单：
+    modules  导入的模块
+    lazy     其中延迟加载的模块，首次收到相关指令或事件时才触发 Load
+导入本包只读取清单，默认清单由启动脚本调用 writeManifest() 生成
+"""
+import os
+import yaml
+
+from core.extern.config import Config
+from core.loader import Loader
+
+
+MANIFEST = './config/modules.yml'
+
+manifest = {
+    'modules': ['admin', 'forest', 'repeater', 'revolver', 'search'],
+    # 只有指令、没有定时任务的模块可以延迟加载
+    'lazy': ['revolver', 'search']
+}
+
+if os.path.exists(MANIFEST):
+    with open(MANIFEST, encoding='utf-8') as f:
+        try:
+            manifest = Config.update(manifest, yaml.load(f, Loader=yaml.FullLoader) or {})
+        except Exception as e:
+            print('模块清单损坏，使用默认清单: ', e)
+
+
+def writeManifest() -> None:
+    """清单文件不存在时写入当前使用的清单，便于修改"""
+    if os.path.exists(MANIFEST):
+        return
+    os.makedirs(os.path.dirname(MANIFEST), exist_ok=True)
+    with open(MANIFEST, 'w', encoding='utf-8') as f:
+        yaml.dump(manifest, f)
+
+
+for name in manifest['lazy']:
+    if name in manifest['modules']:
+        Loader.defer(name)
+
+Loader.importModules(__name__, manifest['modules'])
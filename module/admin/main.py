@@ -0,0 +1,128 @@
+
+from core.message import Message
+from core.message import RefMsg
+from core.loader import CommandType, Loader
+from core.extern.config import Config
+from core.application import App
+from core.event import ContactMessageRecvEvent, GroupMessageRecvEvent
+from core.metrics import metrics
+
+
+config = Config('admin')
+
+settings = {
+    'admins': []
+}
+
+
+@Loader.listen('Load')
+async def onLoad(app: App):
+    global settings
+
+    settings = await config.load('conf.yml', settings)
+
+    print('Admin加载成功')
+
+
+def isAdmin(id: int) -> bool:
+    return id in settings['admins']
+
+
+@Loader.command('指标', CommandType.Group)
+async def groupMetrics(app: App, e: GroupMessageRecvEvent):
+    if not isAdmin(e.sender.id):
+        return
+    await app.sendGroupMessage(e.group.id, Message.phrase(
+        RefMsg(target=e.sender.id),
+        "\n" + metrics.summary()
+    ))
+
+
+@Loader.command('指标', CommandType.Contact)
+async def contactMetrics(app: App, e: ContactMessageRecvEvent):
+    if not isAdmin(e.sender.id):
+        return
+    await app.replyContactMessage(e.sender, metrics.summary())
+
+
+async def toggleGroup(app: App, e: GroupMessageRecvEvent, enable: bool):
+    moduleName = str(e.msg).strip()
+    if moduleName not in Loader.enabledGroups:
+        await app.sendGroupMessage(e.group.id, Message.phrase(
+            RefMsg(target=e.sender.id),
+            f" 没有可按群启用的模块“{moduleName}”，"
+            f"可选: {', '.join(sorted(Loader.enabledGroups))}"
+        ))
+        return
+    # 延迟模块先加载，避免之后加载配置时覆盖本次修改
+    await Loader.ensureLoaded(app, moduleName)
+    if enable:
+        Loader.enableGroup(moduleName, e.group.id)
+    else:
+        Loader.disableGroup(moduleName, e.group.id)
+    # 写回模块的 conf.yml，重载与重启后保持
+    moduleConfig = Config(moduleName)
+    conf = await moduleConfig.read('conf.yml') or {}
+    await moduleConfig.save('conf.yml', dict(
+        conf, enabled_groups=sorted(Loader.enabledGroups[moduleName])))
+    await app.sendGroupMessage(e.group.id, Message.phrase(
+        RefMsg(target=e.sender.id),
+        f" 已在本群{'启用' if enable else '停用'} {moduleName}"
+    ))
+
+
+@Loader.command('启用', CommandType.Group)
+async def enableModule(app: App, e: GroupMessageRecvEvent):
+    if not isAdmin(e.sender.id):
+        return
+    await toggleGroup(app, e, True)
+
+
+@Loader.command('停用', CommandType.Group)
+async def disableModule(app: App, e: GroupMessageRecvEvent):
+    if not isAdmin(e.sender.id):
+        return
+    await toggleGroup(app, e, False)
+
+
+@Loader.command('模块', CommandType.Group)
+async def listModules(app: App, e: GroupMessageRecvEvent):
+    if not isAdmin(e.sender.id):
+        return
+    lines = []
+    for moduleName in sorted(Loader.enabledGroups):
+        state = '启用' if e.group.id in Loader.enabledGroups[moduleName] else '停用'
+        lines.append(f'{moduleName}: {state}')
+    await app.sendGroupMessage(e.group.id, Message.phrase(
+        RefMsg(target=e.sender.id),
+        "\n" + '\n'.join(lines)
+    ))
+
+
+async def reloadModules(app: App, arguments: str) -> str:
+    names = arguments.split() or Loader.reloadable()
+    unknown = [name for name in names if name not in Loader.reloadable()]
+    if unknown:
+        return f"没有可重载的模块“{', '.join(unknown)}”，可选: {', '.join(Loader.reloadable())}"
+    failures = await app.reloadModules(names)
+    if failures:
+        return "重载失败:\n" + '\n'.join(f'{name}: {error}' for name, error in failures.items())
+    return f"已重载 {', '.join(names)}"
+
+
+@Loader.command('重载', CommandType.Group)
+async def groupReload(app: App, e: GroupMessageRecvEvent):
+    if not isAdmin(e.sender.id):
+        return
+    reply = await reloadModules(app, str(e.msg).strip())
+    await app.sendGroupMessage(e.group.id, Message.phrase(
+        RefMsg(target=e.sender.id),
+        " " + reply
+    ))
+
+
+@Loader.command('重载', CommandType.Contact)
+async def contactReload(app: App, e: ContactMessageRecvEvent):
+    if not isAdmin(e.sender.id):
+        return
+    await app.replyContactMessage(e.sender, await reloadModules(app, str(e.msg).strip()))
@@ -7,12 +7,12 @@ from .prob import (
 )
 
 import re
-import yaml
 import pydblite
 import _thread
+import threading
 import time
+import asyncio
 
-from bisect import bisect_left
 from typing import Any, Dict, Tuple
 
 from core.message import Message
@@ -32,13 +32,18 @@ from module.session import Session, SessionLib
 
 MODULE_NAME = 'forest'
 
-data = Data(MODULE_NAME)
 config = Config(MODULE_NAME)
 sessions = SessionLib(MODULE_NAME)
 
-db = pydblite.Base(f'{data.getfo()}/{MODULE_NAME}.db')
-userdb = pydblite.Base(f'{data.getfo()}/user.db')
-crontab = Crontab()
+# 数据库与计时线程在加载时创建，导入模块没有副作用
+db: pydblite.Base = None
+userdb: pydblite.Base = None
+crontab: Crontab = None
+loop: asyncio.AbstractEventLoop = None
+# 数据库已打开，卸载时需要保存
+loaded = False
+# 卸载时停止自动保存
+stopped = threading.Event()
 
 settings = {
     'enabled_groups': [],
@@ -47,6 +52,11 @@ settings = {
     'admin': 0
 }
 
+# 按群启用，启用的群在加载配置后确定
+Loader.gate(MODULE_NAME)
+# 数据库文件与种树计时只能由一个进程持有
+Loader.stateful(MODULE_NAME)
+
 
 def hourToSec(hour: float) -> int:
     return int(hour * 3600)
@@ -82,17 +92,22 @@ def formatTime(sec: int):
 
 
 def dbCommit():
-    while True:
-        time.sleep(10)
+    while not stopped.wait(10):
         db.commit()
 
 
-def plantComplete(app: App, groupId: int, memberId: int, type: str='success'):
+def plantTimeout(app: App, groupId: int, memberId: int):
+    # 由 Crontab 线程调用，将结算投递回事件循环执行
+    asyncio.run_coroutine_threadsafe(
+        plantComplete(app, groupId, memberId), loop)
+
+
+async def plantComplete(app: App, groupId: int, memberId: int, type: str='success'):
     info = db(groupId=groupId, memberId=memberId)[0]
     if type == 'success':
         proc = info['duration'] / settings['max_time'] * 100
         treeId, quality = lottery(proc)
-        app.sendGroupMessage(groupId, Message.phrase(
+        await app.sendGroupMessage(groupId, Message.phrase(
             RefMsg(target=memberId),
             "的树长大啦！\n"
             f"{getCongratulations(quality)}"
@@ -115,76 +130,70 @@ def plantComplete(app: App, groupId: int, memberId: int, type: str='success'):
             )
         userdb.commit()
     elif type == 'cancel':
-        app.sendGroupMessage(groupId, Message.phrase(
+        await app.sendGroupMessage(groupId, Message.phrase(
             RefMsg(target=memberId),
             "取消了种树，树枯萎了..."
         ))
-        app.unmute(groupId, memberId)
+        await app.unmute(groupId, memberId)
     else:
         return
 
     del db[info['__id__']]
 
 
-@Loader.listen('Load')
-async def onLoad(app: App):
-    global settings
-
-    settings_tmp = settings.copy()
-
-    haveError = False
+def openDatabases() -> None:
+    """打开或创建数据库，在线程池中执行"""
+    if userdb.exists():
+        userdb.open()
+    else:
+        userdb.create('userid', 'bag', 'accumulate')
+        userdb.create_index('userid')
+        userdb.commit()
 
-    conf = config.getf('conf.yml')
-    if conf is None:
-        conf = config.touch('conf.yml')
+    if db.exists():
+        db.open()
     else:
-        newSettings = yaml.load(conf, Loader=yaml.FullLoader)
-        try:
-            settings_tmp = config.update(settings, newSettings)
-        except Exception as e:
-            print('配置文件损坏，重置为默认配置，旧文件备份为 conf.yml.bkp')
-            try:
-                config.backup('conf.yml')
-            except Exception as e:
-                print('备份失败，使用默认配置，取消覆写 conf.yml')
+        db.create('groupId', 'memberId', 'groupName', 'duration', 'endTime')
+        db.create_index('groupId', 'memberId')
+        db.commit()
+
 
-    conf.seek(0)
-    conf.truncate()
+@Loader.listen('Load')
+async def onLoad(app: App):
+    global settings
+    global loop
+    global loaded
+    global db
+    global userdb
+    global crontab
 
-    if not haveError:
-        settings = settings_tmp
-        yaml.dump(settings_tmp, conf)
+    loop = asyncio.get_event_loop()
 
-    settings['enabled_groups'].sort()
+    settings = await config.load('conf.yml', settings)
 
-    conf.close()
+    Loader.gate(MODULE_NAME, settings['enabled_groups'])
 
     try:
-        init(config)
+        await init(config)
     except Exception as e:
         print('加载树木信息时出现致命错误: ', e)
         print('模块将无法正常运行，请立即终止进程')
         return
 
-    if userdb.exists():
-        userdb.open()
-    else:
-        userdb.create('userid', 'bag', 'accumulate')
-        userdb.create_index('userid')
-        userdb.commit()
+    data = Data(MODULE_NAME)
+    db = pydblite.Base(f'{data.getfo()}/{MODULE_NAME}.db')
+    userdb = pydblite.Base(f'{data.getfo()}/user.db')
+    crontab = Crontab()
 
-    if db.exists():
-        db.open()
-        for record in db:
-            groupId = record['groupId']
-            memberId = record['memberId']
-            endTime = record['endTime']
-            crontab.addabs(f'{groupId}.{memberId}',
-                           endTime, plantComplete, (app, groupId, memberId))
-    else:
-        db.create('groupId', 'memberId', 'groupName', 'duration', 'endTime')
-        db.create_index('groupId', 'memberId')
-        db.commit()
+    await loop.run_in_executor(None, openDatabases)
+    for record in db:
+        groupId = record['groupId']
+        memberId = record['memberId']
+        endTime = record['endTime']
+        crontab.addabs(f'{groupId}.{memberId}',
+                       endTime, plantTimeout, (app, groupId, memberId))
+
+    loaded = True
 
     # 启动数据库自动保存循环
     _thread.start_new_thread(dbCommit, ())
@@ -192,11 +201,15 @@ async def onLoad(app: App):
     print('Forest加载成功')
 
 
-def existElem(l: list, elem: Any) -> bool:
-    i = bisect_left(l, elem)
-    if i != len(l) and l[i] == elem:
-        return True
-    return False
+@Loader.listen('Unload')
+async def onUnload(app: App):
+    # 未完成的种树计时在重新加载时从数据库恢复
+    stopped.set()
+    if crontab is not None:
+        crontab.stop()
+    if loaded:
+        db.commit()
+        userdb.commit()
 
 
 @Loader.command("种树", CommandType.Group)
@@ -208,11 +221,8 @@ async def plantCommand(app: App, e: GroupMessageRecvEvent):
     if e.group.permission == PermissionType.Member:
         return
 
-    if not existElem(settings['enabled_groups'], groupId):
-        return
-
     if len(str(message).strip()) == 0:
-        app.sendGroupMessage(groupId, Message.phrase(
+        await app.sendGroupMessage(groupId, Message.phrase(
             RefMsg(target=memberId),
             ("欢迎使用种树功能\n"
              "不 要 挑 战 自 制 力！\n"
@@ -233,7 +243,7 @@ async def plantCommand(app: App, e: GroupMessageRecvEvent):
 
     m = re.match(r'^(\d+(\.\d+)?)\s*(h|d|min|s)$', message)
     if m is None:
-        app.sendGroupMessage(groupId, Message.phrase(
+        await app.sendGroupMessage(groupId, Message.phrase(
             RefMsg(target=memberId),
             (f"格式不对哦，使用 {app.commandHead[0]}种树 查看帮助")
         ))
@@ -253,7 +263,7 @@ async def plantCommand(app: App, e: GroupMessageRecvEvent):
         sec = int(num)
 
     if sec > settings['max_time'] or sec < settings['min_time']:
-        app.sendGroupMessage(groupId, Message.phrase(
+        await app.sendGroupMessage(groupId, Message.phrase(
             RefMsg(target=memberId),
             (f"你输入的是{formatTime(sec)}\n"
              "种树时间不可取喔~\n"
@@ -262,8 +272,8 @@ async def plantCommand(app: App, e: GroupMessageRecvEvent):
         ))
         return
 
-    app.mute(groupId, memberId, sec)
-    app.sendGroupMessage(groupId, Message.phrase(
+    await app.mute(groupId, memberId, sec)
+    await app.sendGroupMessage(groupId, Message.phrase(
         RefMsg(target=memberId),
         (f"要专注哦~{app.nickname}为你加油！")
     ))
@@ -277,7 +287,7 @@ async def plantCommand(app: App, e: GroupMessageRecvEvent):
               duration=sec,
               endTime=round(time.time()) + sec)
     crontab.add(f'{groupId}.{memberId}', sec,
-                plantComplete, (app, groupId, memberId))
+                plantTimeout, (app, groupId, memberId))
 
 
 @Loader.command("逛树林", CommandType.Group)
@@ -301,11 +311,11 @@ async def groupViewTrees(app: App, e: GroupMessageRecvEvent):
                 reply += f"  【{getQualityDescription(item['quality'])}】{item['name']}×{cnt}\n"
         reply = reply[:-1]
     if empty:
-        app.sendGroupMessage(e.group.id, Message.phrase(
+        await app.sendGroupMessage(e.group.id, Message.phrase(
             RefMsg(target=e.sender.id), "哎呀，你的树林空空如也呢，快去种树吧~")
         )
     else:
-        app.sendGroupMessage(e.group.id, Message.phrase(
+        await app.sendGroupMessage(e.group.id, Message.phrase(
             RefMsg(target=e.sender.id), reply)
         )
 
@@ -328,9 +338,9 @@ async def contactViewTrees(app: App, e: ContactMessageRecvEvent):
                 reply += f"  【{getQualityDescription(item['quality'])}】{item['name']}×{cnt}\n"
         reply = reply[:-1]
     if empty:
-        app.replyContactMessage(e.sender, "哎呀，你的树林空空如也呢，快去种树吧~")
+        await app.replyContactMessage(e.sender, "哎呀，你的树林空空如也呢，快去种树吧~")
     else:
-        app.replyContactMessage(e.sender, reply)
+        await app.replyContactMessage(e.sender, reply)
 
 
 @Loader.command("加速卡", CommandType.Group)
@@ -356,30 +366,30 @@ async def unplantCommand(app: App, e: ContactMessageRecvEvent):
             if str.isdigit(message):
                 id = int(message)
                 if 1 <= id <= optionCnt:
-                    app.replyContactMessage(sender, 
+                    await app.replyContactMessage(sender, 
                         ("你确定嘛？\n"
                          "输入“确定”放弃种树，输入其他内容取消操作")
                     )
                     session.set('groupId', options[id])
                     session.next()
                 else:
-                    app.replyContactMessage(sender, "范围要正确哦~")
+                    await app.replyContactMessage(sender, "范围要正确哦~")
             elif message == "取消":
-                app.replyContactMessage(sender, "取消啦~")
+                await app.replyContactMessage(sender, "取消啦~")
                 sessions.closeSession(contactId)
                 app.unredirect(str(contactId))
             else:
-                app.replyContactMessage(sender, "输入的内容不正确~")
+                await app.replyContactMessage(sender, "输入的内容不正确~")
         elif step == 2:
             if message == "确定":
-                app.replyContactMessage(sender, "臭水群怪，给你解除禁言了喔~")
+                await app.replyContactMessage(sender, "臭水群怪，给你解除禁言了喔~")
                 groupId = session.get('groupId')
-                plantComplete(app, groupId, contactId, type='cancel')
+                await plantComplete(app, groupId, contactId, type='cancel')
                 sessions.closeSession(contactId)
                 app.unredirect(str(contactId))
                 crontab.remove(f'{groupId}.{contactId}')
             else:
-                app.replyContactMessage(sender, "未输入确定，操作取消啦~继续专注喔~")
+                await app.replyContactMessage(sender, "未输入确定，操作取消啦~继续专注喔~")
                 sessions.closeSession(contactId)
                 app.unredirect(str(contactId))
 
@@ -389,7 +399,7 @@ async def unplantCommand(app: App, e: ContactMessageRecvEvent):
     records = db(memberId=contactId)
 
     if len(records) == 0:
-        app.replyContactMessage(sender, "你没有在种的树哦~")
+        await app.replyContactMessage(sender, "你没有在种的树哦~")
         return
 
     options: Dict[int, int] = {}
@@ -405,7 +415,7 @@ async def unplantCommand(app: App, e: ContactMessageRecvEvent):
     session.set('optionCnt', optCnt)
     session.next()
     
-    app.replyContactMessage(sender, Message.phrase(
+    await app.replyContactMessage(sender, Message.phrase(
         ("你有以下几个正在种树的群\n"
          + reply +
          "请输入序号(仅数字)\n"
@@ -1,5 +1,4 @@
 import random
-import yaml
 
 from copy import deepcopy
 
@@ -7,11 +6,12 @@ from core.extern.config import Config
 
 trees: dict = {}
 
-def init(config: Config) -> None:
+async def init(config: Config) -> None:
+    """树木信息由配置服务解析并缓存，只读"""
     global trees
-    treef = config.getf('trees.yml')
-    trees = yaml.load(treef, Loader=yaml.FullLoader)
-    treef.close()
+    trees = await config.read('trees.yml')
+    if trees is None:
+        raise Exception('缺少 trees.yml')
 
 
 def getQualityDescription(quality: int) -> str:
@@ -1,11 +1,9 @@
-import yaml
 import time
 import _thread
 import random
 
 from queue import Queue
-from bisect import bisect_left
-from typing import Any, Dict
+from typing import Dict
 
 from core.extern.config import Config
 from core.application import App
@@ -20,7 +18,7 @@ class Cooldown:
 
 
 class Info:
-    def __init__(self, idle: bool, last: str) -> None:
+    def __init__(self, idle: bool, last: int) -> None:
         self.idle = idle
         self.last = last
 
@@ -37,11 +35,17 @@ settings = {
     'cooldown': 5000  # 10s
 }
 
+# 按群启用，启用的群在加载配置后确定
+Loader.gate('repeater')
+
 
 def cooldown_thread():
     t_now = int(time.time())
     while True:
         cd = cooldownQueue.get(True)
+        # 模块卸载
+        if cd is None:
+            return
 
         t_later = cd.unlockTime
         time.sleep((t_later - t_now) / 1000.0)
@@ -49,13 +53,6 @@ def cooldown_thread():
         groupInfo[cd.groupId].idle = True
     
 
-def existElem(l: list, elem: Any) -> bool:
-    i = bisect_left(l, elem)
-    if i != len(l) and l[i] == elem:
-        return True
-    return False
-
-
 def checkBan(l: list, raw: str):
     pass
 
@@ -65,54 +62,34 @@ async def onLoad(app: App):
     global settings
     global groupInfo
 
-    settings_tmp = settings.copy()
-
-    haveError = False
-
-    conf = config.getf('conf.yml')
-    if conf is None:
-        conf = config.touch('conf.yml')
-    else:
-        newSettings = yaml.load(conf, Loader=yaml.FullLoader)
-        try:
-            settings_tmp = config.update(settings, newSettings)
-        except Exception as e:
-            print('配置文件损坏，重置为默认配置，旧文件备份为 conf.yml.bkp')
-            try:
-                config.backup('conf.yml')
-            except Exception as e:
-                print('备份失败，使用默认配置，取消覆写 conf.yml')
-
-    conf.seek(0)
-    conf.truncate()
+    settings = await config.load('conf.yml', settings)
 
-    if not haveError:
-        settings = settings_tmp
-        yaml.dump(settings_tmp, conf)
-
-    settings['enabled_groups'].sort()
+    Loader.gate('repeater', settings['enabled_groups'])
     settings['banned_words'].sort()
-    
-    conf.close()
 
     for id in settings['enabled_groups']:
-        groupInfo[id] = Info(True, "")
+        groupInfo[id] = Info(True, None)
     
     _thread.start_new_thread(cooldown_thread, ())
 
     print('复读机加载成功')
 
 
+@Loader.listen('Unload')
+async def onUnload(app: App):
+    cooldownQueue.put(None)
+
+
 @Loader.listen('GroupMessage')
 async def onRecvGroupMessage(app: App, e: GroupMessageRecvEvent):
     groupId = e.group.id
     message = e.msg
 
-    if not existElem(settings['enabled_groups'], groupId):
-        return
-
-    info = groupInfo[groupId]
-    new = message.md5()
+    info = groupInfo.get(groupId)
+    if info is None:
+        # 运行时新启用的群
+        info = groupInfo[groupId] = Info(True, None)
+    new = message.fingerprint()
     last = info.last
     info.last = new
 
@@ -123,7 +100,7 @@ async def onRecvGroupMessage(app: App, e: GroupMessageRecvEvent):
         return
     if random.random() > settings['repeat_prob']:
         return
-    app.sendGroupMessage(groupId, message)
+    await app.sendGroupMessage(groupId, message)
     info.idle = False
 
     t = int(time.time()) + settings['cooldown']
@@ -1,10 +1,8 @@
 import re
-import yaml
 import time
 import _thread
 
-from bisect import bisect_left
-from typing import Any, Dict
+from typing import Dict
 from queue import Queue
 
 from core.message import Message
@@ -23,6 +21,9 @@ settings = {
     'timeout': 10 * 60
 }
 
+# 按群启用，启用的群在加载配置后确定
+Loader.gate('revolver')
+
 
 class Cooldown:
     def __init__(self, id: int, unlockAt: int) -> None:
@@ -43,6 +44,9 @@ def cooldown_thread():
     t_now = int(time.time())
     while True:
         cd = cooldownQueue.get(True)
+        # 模块卸载
+        if cd is None:
+            return
 
         t_later = cd.unlockTime
         time.sleep((t_later - t_now) / 1000.0)
@@ -54,45 +58,18 @@ def cooldown_thread():
 async def onLoad(app: App):
     global settings
 
-    settings_tmp = settings.copy()
+    settings = await config.load('conf.yml', settings)
 
-    haveError = False
-
-    conf = config.getf('conf.yml')
-    if conf is None:
-        conf = config.touch('conf.yml')
-    else:
-        newSettings = yaml.load(conf, Loader=yaml.FullLoader)
-        try:
-            settings_tmp = config.update(settings, newSettings)
-        except Exception as e:
-            print('配置文件损坏，重置为默认配置，旧文件备份为 conf.yml.bkp')
-            try:
-                config.backup('conf.yml')
-            except Exception as e:
-                print('备份失败，使用默认配置，取消覆写 conf.yml')
-
-    conf.seek(0)
-    conf.truncate()
-
-    if not haveError:
-        settings = settings_tmp
-        yaml.dump(settings_tmp, conf)
-
-    settings['enabled_groups'].sort()
-    
-    conf.close()
+    Loader.gate('revolver', settings['enabled_groups'])
 
     _thread.start_new_thread(cooldown_thread, ())
 
     print('Revolver加载成功')
 
 
-def existElem(l: list, elem: Any) -> bool:
-    i = bisect_left(l, elem)
-    if i != len(l) and l[i] == elem:
-        return True
-    return False
+@Loader.listen('Unload')
+async def onUnload(app: App):
+    cooldownQueue.put(None)
 
 
 @Loader.command('转轮手枪', CommandType.Group)
@@ -103,11 +80,8 @@ async def onCommand(app: App, e: GroupMessageRecvEvent):
     if e.group.permission == PermissionType.Member:
         return
 
-    if not existElem(settings['enabled_groups'], groupId):
-        return
-    
     if len(argument) == 0:
-        app.sendGroupMessage(groupId, Message.phrase(
+        await app.sendGroupMessage(groupId, Message.phrase(
             RefMsg(target=e.sender.id),
             ("欢迎来玩转轮手枪~\n"
             "嘎嘎嘎~这是一个恐怖的游戏！\n"
@@ -117,12 +91,12 @@ async def onCommand(app: App, e: GroupMessageRecvEvent):
         ))
     
     if groupInfo[groupId.id].idle:
-        app.sendGroupMessage(groupId, Message.phrase(
+        await app.sendGroupMessage(groupId, Message.phrase(
             RefMsg(target=e.sender.id),
             "已经重新装填弹药咯！"
         ))
     else:
-        app.sendGroupMessage(groupId, Message.phrase(
+        await app.sendGroupMessage(groupId, Message.phrase(
             RefMsg(target=e.sender.id),
             "本轮比赛还没有结束哟~"
         ))
@@ -130,11 +104,6 @@ async def onCommand(app: App, e: GroupMessageRecvEvent):
 
 @Loader.command('扣扳机', CommandType.Group)
 async def onCommand(app: App, e: GroupMessageRecvEvent):
-    groupId = e.group.id
-
     if e.group.permission == PermissionType.Member:
         return
 
-    if not existElem(settings['enabled_groups'], groupId):
-        return
-    
@@ -1,8 +1,6 @@
 import re
-import yaml
 
-from bisect import bisect_left
-from typing import Any
+from functools import wraps
 from urllib.parse import quote
 
 from core.message import Message
@@ -20,38 +18,16 @@ settings = {
     'enabled_groups': []
 }
 
+# 按群启用，启用的群在加载配置后确定
+Loader.gate('search')
+
 @Loader.listen('Load')
 async def onLoad(app: App):
     global settings
 
-    settings_tmp = settings.copy()
-
-    haveError = False
-
-    conf = config.getf('conf.yml')
-    if conf is None:
-        conf = config.touch('conf.yml')
-    else:
-        newSettings = yaml.load(conf, Loader=yaml.FullLoader)
-        try:
-            settings_tmp = config.update(settings, newSettings)
-        except Exception as e:
-            print('配置文件损坏，重置为默认配置，旧文件备份为 conf.yml.bkp')
-            try:
-                config.backup('conf.yml')
-            except Exception as e:
-                print('备份失败，使用默认配置，取消覆写 conf.yml')
-
-    conf.seek(0)
-    conf.truncate()
+    settings = await config.load('conf.yml', settings)
 
-    if not haveError:
-        settings = settings_tmp
-        yaml.dump(settings_tmp, conf)
-
-    settings['enabled_groups'].sort()
-    
-    conf.close()
+    Loader.gate('search', settings['enabled_groups'])
 
     print('Search加载成功')
 
@@ -65,20 +41,12 @@ def genMsg(search_str: str, search_engine: str) -> str:
     msg = f'正在从 {search_engine} 中搜索...\n'
     return msg+prefix[search_engine]+quote(search_str)
 
-def existElem(l: list, elem: Any) -> bool:
-    i = bisect_left(l, elem)
-    if i != len(l) and l[i] == elem:
-        return True
-    return False
-
 def common(func):
+    @wraps(func)
     async def wrapper(app: App, e: GroupMessageRecvEvent):
         groupId = e.group.id
-        if not existElem(settings['enabled_groups'], groupId):
-            return
-
         if not await func(app, e):
-            app.sendGroupMessage(groupId, Message.phrase(
+            await app.sendGroupMessage(groupId, Message.phrase(
                 RefMsg(target=e.sender.id),
                 ("使用方法： .(google | baidu | github | bilibili) search_string")
             ))
@@ -92,7 +60,7 @@ async def google_search(app: App, e: GroupMessageRecvEvent):
     message = str(e.msg).strip()
     
     if message: 
-        app.sendGroupMessage(groupId, genMsg(message, 'google'))
+        await app.sendGroupMessage(groupId, genMsg(message, 'google'))
         return True
     else:
         return False
@@ -104,7 +72,7 @@ async def baidu_search(app: App, e: GroupMessageRecvEvent):
     message = str(e.msg).strip()
     
     if message: 
-        app.sendGroupMessage(groupId, genMsg(message, 'baidu'))
+        await app.sendGroupMessage(groupId, genMsg(message, 'baidu'))
         return True
     else:
         return False
@@ -116,7 +84,7 @@ async def github_search(app: App, e: GroupMessageRecvEvent):
     message = str(e.msg).strip()
     
     if message: 
-        app.sendGroupMessage(groupId, genMsg(message, 'github'))
+        await app.sendGroupMessage(groupId, genMsg(message, 'github'))
         return True
     else:
         return False
@@ -128,7 +96,7 @@ async def bilibili_search(app: App, e: GroupMessageRecvEvent):
     message = str(e.msg).strip()
     
     if message: 
-        app.sendGroupMessage(groupId, genMsg(message, 'bilibili'))
+        await app.sendGroupMessage(groupId, genMsg(message, 'bilibili'))
         return True
     else:
         return False
@@ -1,8 +1,6 @@
 import re
-import yaml
 
 from pydantic.dataclasses import dataclass
-from bisect import bisect_left
 from typing import Any, Dict
 from queue import Queue
 from enum import Enum, unique
@@ -23,6 +21,9 @@ settings = {
     'max_stack': 10
 }
 
+# 按群启用，启用的群在加载配置后确定
+Loader.gate('solo')
+
 
 @unique
 class CommandType(Enum):
@@ -55,45 +56,13 @@ class Database:
 challenges: Dict[int, Dict[int, Challenge]]
 
 
-def existElem(l: list, elem: Any) -> bool:
-    i = bisect_left(l, elem)
-    if i != len(l) and l[i] == elem:
-        return True
-    return False
-
-
 @Loader.listen('Load')
 async def onLoad(app: App):
     global settings
 
-    settings_tmp = settings.copy()
-
-    haveError = False
-
-    conf = config.getf('conf.yml')
-    if conf is None:
-        conf = config.touch('conf.yml')
-    else:
-        newSettings = yaml.load(conf, Loader=yaml.FullLoader)
-        try:
-            settings_tmp = config.update(settings, newSettings)
-        except Exception as e:
-            print('配置文件损坏，重置为默认配置，旧文件备份为 conf.yml.bkp')
-            try:
-                config.backup('conf.yml')
-            except Exception as e:
-                print('备份失败，使用默认配置，取消覆写 conf.yml')
-
-    conf.seek(0)
-    conf.truncate()
-
-    if not haveError:
-        settings = settings_tmp
-        yaml.dump(settings_tmp, conf)
+    settings = await config.load('conf.yml', settings)
 
-    settings['enabled_groups'].sort()
-    
-    conf.close()
+    Loader.gate('solo', settings['enabled_groups'])
 
     print('Solo加载成功')
 
@@ -103,7 +72,7 @@ async def Solo(app: App, e: GroupMessageRecvEvent):
     arguments = str(e.msg).strip()
 
     if len(arguments) == 0:
-        app.sendGroupMessage(e.group, Message.phrase(
+        await app.sendGroupMessage(e.group, Message.phrase(
             RefMsg(target=e.sender.id),
             ("欢迎来玩拼点~\n"
             "“拼点@对方”可以下达战书或者应战\n"
@@ -120,7 +89,7 @@ async def Solo(app: App, e: GroupMessageRecvEvent):
     arguments = str(e.msg).strip()
 
     if len(arguments) == 0:
-        app.sendGroupMessage(e.group, Message.phrase(
+        await app.sendGroupMessage(e.group, Message.phrase(
             RefMsg(target=e.sender.id),
             "你没有at你的对手喔~"
         ))
@@ -131,7 +100,7 @@ async def Solo(app: App, e: GroupMessageRecvEvent):
     arguments = str(e.msg).strip()
 
     if len(arguments) == 0:
-        app.sendGroupMessage(e.group, Message.phrase(
+        await app.sendGroupMessage(e.group, Message.phrase(
             RefMsg(target=e.sender.id),
             ("已放弃挑战~")
         ))
@@ -141,7 +110,7 @@ async def Solo(app: App, e: GroupMessageRecvEvent):
     arguments = str(e.msg).strip()
 
     if len(arguments) == 0:
-        app.sendGroupMessage(e.group, Message.phrase(
+        await app.sendGroupMessage(e.group, Message.phrase(
             RefMsg(target=e.sender.id),
             (""
             "")
@@ -152,7 +121,7 @@ async def Solo(app: App, e: GroupMessageRecvEvent):
     arguments = str(e.msg).strip()
 
     if len(arguments) == 0:
-        app.sendGroupMessage(e.group, Message.phrase(
+        await app.sendGroupMessage(e.group, Message.phrase(
             RefMsg(target=e.sender.id),
             ("请at你的对手喔~")
         ))
\ No newline at end of file
@@ -1,6 +1,17 @@
-from mirai.application import Mirai
+import module
+import mirai.settings as s
 
-appMirai = Mirai()
-appMirai.run()
+from mirai.application import MiraiHost
+from mirai.shard import ShardReader
 
-# TODO 模块优先级
\ No newline at end of file
+
+# 分片运行时工作进程以 spawn 方式启动，会重新导入本文件
+if __name__ == '__main__':
+    module.writeManifest()
+    if s.WORKERS > 1:
+        appMirai = ShardReader(s.WORKERS)
+    else:
+        appMirai = MiraiHost.fromSettings()
+    appMirai.run()
+
+# TODO 模块优先级
@@ -0,0 +1,9 @@
+import module
+
+from telegram.application import Telegram
+
+
+if __name__ == '__main__':
+    module.writeManifest()
+    appTelegram = Telegram()
+    appTelegram.run()
@@ -1,4 +1,307 @@
+import asyncio
+import html
+import time
+
+import telegram.settings as s
+
+from aiohttp import web
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from telegram.unify import unifyUpdate
+
 from core.application import App
+from core.loader import CommandType, Loader, installReloadSignal
+from core.router import CommandRouter
+from core.dispatcher import Dispatcher
+from core.outbound import SendQueue
+from core.redirect import RedirectRegistry
+from core.metrics import metrics, serve as serveMetrics
+from util.httpclient import HttpClient
+from core.event import ContactMessageRecvEvent, GroupMessageRecvEvent
+from core.message import ImgMsg, Message, RefMsg
+from core.entity.group import Group, Member
+from core.entity.contact import Contact
+
+
+EVENTS = {
+    'GroupMessage': GroupMessageRecvEvent,
+    'FriendMessage': ContactMessageRecvEvent
+}
+
+# 记录最近发出的消息所在的会话，撤回时需要
+SENT_HISTORY = 4096
+# 记录最近发言用户的名字，用于渲染 At
+NAME_HISTORY = 4096
+# 群成员状态到群身份的映射，其余状态均为普通成员
+_STATUS = {
+    'creator': 'Owner',
+    'administrator': 'Admin'
+}
+
 
 class Telegram(App):
-    pass
\ No newline at end of file
+    """
+    Telegram Bot API 适配器
+    以长轮询（或 Webhook）批量取回更新，转换为与 mirai 相同的统一事件字典后
+    交由分发器并发处理；出站消息经 SendQueue 按会话限速后通过连接池发送
+    """
+
+    def __init__(self) -> None:
+        self.account: int = int(s.BOT_TOKEN.split(':', 1)[0])
+        self.username: str = None
+        self.nickname: str = s.NICKNAME
+        self.commandHead: str = s.CMD_HEAD
+        self.redirects = RedirectRegistry(s.REDIRECT_TTL)
+        self.offset: int = 0
+
+        self.dispatcher = Dispatcher(s.MAX_INFLIGHT, s.MAX_PENDING, s.MAX_BACKLOG)
+        apiUrl = f'{s.API_URL.rstrip("/")}/bot{s.BOT_TOKEN}'
+        self.http = HttpClient(
+            apiUrl,
+            poolSize=s.HTTP_POOL_SIZE,
+            concurrency=s.HTTP_CONCURRENCY,
+            timeout=s.HTTP_TIMEOUT,
+            observer=metrics.record
+        )
+        # 长轮询请求会挂起 POLL_TIMEOUT 秒，单独使用一个连接
+        self.poller = HttpClient(apiUrl, poolSize=1, concurrency=1,
+                                 timeout=s.POLL_TIMEOUT + s.HTTP_TIMEOUT)
+        self.outbound = SendQueue(
+            self._deliver,
+            rate=s.SEND_RATE,
+            burst=s.SEND_BURST,
+            globalRate=s.SEND_GLOBAL_RATE,
+            globalBurst=s.SEND_GLOBAL_BURST,
+            window=s.COALESCE_WINDOW,
+            maxLength=s.COALESCE_MAX_LENGTH,
+            maxMerge=s.COALESCE_MAX_MERGE,
+            maxQueued=s.SEND_QUEUE_SIZE
+        )
+
+        heads = [s.CMD_HEAD] + s.ALT_CMD_HEAD
+        self.groupRouter = CommandRouter(heads)
+        self.contactRouter = CommandRouter(heads)
+        Loader.subscribe(CommandType.Group, self.groupRouter.add, self.groupRouter.remove)
+        Loader.subscribe(CommandType.Contact, self.contactRouter.add, self.contactRouter.remove)
+
+        self.sentChats: "OrderedDict[int, int]" = OrderedDict()
+        self.names: "OrderedDict[int, str]" = OrderedDict()
+        # 群 -> (过期时间, 管理员 -> 群身份)，用于填入机器人与发送者的群身份
+        self.chatAdmins: Dict[int, Tuple[float, Dict[int, str]]] = {}
+        self.pipeline = self._build_pipeline(s, EVENTS)
+
+    async def _call(self, method: str, payload: dict, client: HttpClient = None) -> dict:
+        resp = await (client or self.http).post(method, payload)
+        if not resp.get('ok'):
+            raise Exception(f'{method} 调用失败: {resp.get("description")}')
+        return resp['result']
+
+    async def _poll(self) -> None:
+        """长轮询，每批更新全部提交给分发器后再取下一批"""
+        while True:
+            try:
+                updates = await self._call('getUpdates', {
+                    'offset': self.offset,
+                    'limit': s.POLL_LIMIT,
+                    'timeout': s.POLL_TIMEOUT,
+                    'allowed_updates': ['message', 'my_chat_member']
+                }, self.poller)
+            except Exception as e:
+                print('拉取更新时出错:', e)
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                self.offset = max(self.offset, update['update_id'] + 1)
+                await self._feed(update)
+
+    async def _serve_webhook(self) -> web.AppRunner:
+        async def handler(request: web.Request) -> web.Response:
+            update = await request.json()
+            await self._feed(update)
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post(s.WEBHOOK_PATH, handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, s.WEBHOOK_HOST, s.WEBHOOK_PORT).start()
+        await self._call('setWebhook', {
+            'url': s.WEBHOOK_URL, 'allowed_updates': ['message', 'my_chat_member']})
+        return runner
+
+    async def _admins(self, chatId: int) -> Dict[int, str]:
+        """群管理员及其群身份，按群缓存 ADMIN_CACHE_TTL 秒"""
+        cached = self.chatAdmins.get(chatId)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        try:
+            result = await self._call('getChatAdministrators', {'chat_id': chatId})
+            admins = {member['user']['id']: _STATUS[member['status']]
+                      for member in result if member['status'] in _STATUS}
+        except Exception as e:
+            print('获取群管理员时出错:', e)
+            admins = cached[1] if cached is not None else {}
+        self.chatAdmins[chatId] = (time.monotonic() + s.ADMIN_CACHE_TTL, admins)
+        return admins
+
+    async def _feed(self, update: dict) -> None:
+        if 'my_chat_member' in update:
+            # 机器人在群中的身份变化，下次收到消息时重新获取
+            self.chatAdmins.pop(update['my_chat_member']['chat']['id'], None)
+            return
+        response = unifyUpdate(update, self.username)
+        if response is None:
+            return
+        sender = response['sender']
+        if 'group' in sender:
+            admins = await self._admins(sender['group']['id'])
+            sender['permission'] = admins.get(sender['id'], 'Member')
+            sender['group']['permission'] = admins.get(self.account, 'Member')
+        self.names[sender['id']] = sender.get('memberName') or sender.get('nickname')
+        self.names.move_to_end(sender['id'])
+        if len(self.names) > NAME_HISTORY:
+            self.names.popitem(last=False)
+        await self.dispatcher.submit(
+            self._conversation_key(response), self._dispatch, response)
+
+    async def _init_modules(self) -> None:
+        await Loader.loadAll(self, s.LOAD_TIMEOUT)
+
+    async def _start(self) -> None:
+        me = await self._call('getMe', {})
+        self.account = me['id']
+        self.username = me.get('username')
+        asyncio.ensure_future(self._sweep_redirects(s.REDIRECT_SWEEP_INTERVAL))
+        if s.METRICS_PORT is not None:
+            await serveMetrics(s.METRICS_HOST, s.METRICS_PORT)
+        if s.WEBHOOK_URL is not None:
+            await self._serve_webhook()
+            await asyncio.Event().wait()
+        else:
+            await self._call('deleteWebhook', {})
+            await self._poll()
+
+    def run(self):
+        loop = asyncio.get_event_loop()
+        installReloadSignal(loop, lambda: self.reloadModules(Loader.reloadable()))
+        try:
+            loop.run_until_complete(self._init_modules())
+            loop.run_until_complete(self._start())
+        finally:
+            loop.run_until_complete(self.http.close())
+            loop.run_until_complete(self.poller.close())
+
+    def _render(self, message: Message) -> str:
+        """渲染为 Telegram HTML，At 渲染为指向用户的链接"""
+        parts = []
+        for msg in message:
+            if isinstance(msg, RefMsg):
+                name = self.names.get(msg.target, str(msg.target))
+                parts.append(f'<a href="tg://user?id={msg.target}">{html.escape(name)}</a>')
+            elif not isinstance(msg, ImgMsg):
+                parts.append(html.escape(str(msg)))
+        return ''.join(parts)
+
+    async def _deliver(self, target: tuple, message: Message) -> int:
+        """由出站队列调用，文本与图片分别发送，返回最后一条消息的 id"""
+        chatId = target[1]
+        messageId = None
+        text = self._render(message)
+        if text:
+            result = await self._call('sendMessage', {
+                'chat_id': chatId, 'text': text, 'parse_mode': 'HTML'})
+            messageId = result['message_id']
+        for msg in message:
+            if isinstance(msg, ImgMsg):
+                photo = msg.url if msg.online else msg.imageId
+                result = await self._call('sendPhoto', {'chat_id': chatId, 'photo': photo})
+                messageId = result['message_id']
+        if messageId is not None:
+            self.sentChats[messageId] = chatId
+            if len(self.sentChats) > SENT_HISTORY:
+                self.sentChats.popitem(last=False)
+        return messageId
+
+    async def sendGroupMessage(self, group: int, message) -> Message:
+        if not isinstance(message, Message):
+            message = Message(raw=message)
+        return message.sent(self.outbound.put(('group', group), message))
+
+    async def sendContactMessage(self, contact: int, message, group: int=None) -> Message:
+        """Telegram 没有临时会话，group 参数被忽略"""
+        if not isinstance(message, Message):
+            message = Message(raw=message)
+        return message.sent(self.outbound.put(('friend', contact), message))
+
+    async def replyContactMessage(self, sender: Contact, message) -> Message:
+        return await self.sendContactMessage(sender.id, message)
+
+    async def setSpecialTitle(self, group: int, id: int, title: str) -> None:
+        """Telegram 只能为机器人提升的管理员设置头衔"""
+        await self._call('setChatAdministratorCustomTitle', {
+            'chat_id': group, 'user_id': id, 'custom_title': title})
+
+    async def mute(self, group: int, id: int, seconds: int) -> None:
+        await self._call('restrictChatMember', {
+            'chat_id': group,
+            'user_id': id,
+            'permissions': {'can_send_messages': False},
+            'until_date': int(time.time() + seconds)
+        })
+
+    async def unmute(self, group: int, id: int) -> None:
+        await self._call('restrictChatMember', {
+            'chat_id': group,
+            'user_id': id,
+            'permissions': _ALL_PERMISSIONS
+        })
+
+    async def muteAll(self, group: int) -> None:
+        await self._call('setChatPermissions', {
+            'chat_id': group, 'permissions': {'can_send_messages': False}})
+
+    async def unmuteAll(self, group: int) -> None:
+        await self._call('setChatPermissions', {
+            'chat_id': group, 'permissions': _ALL_PERMISSIONS})
+
+    async def recall(self, messageId: int) -> None:
+        """撤回消息，只能撤回最近发出的消息"""
+        chatId = self.sentChats.get(messageId)
+        if chatId is None:
+            raise Exception(f'找不到消息 {messageId} 所在的会话')
+        await self._call('deleteMessage', {'chat_id': chatId, 'message_id': messageId})
+
+    async def sendWebImage(self, urls: List[str], contactId: int=None, groupId: int=None) -> None:
+        chatId = groupId if contactId is None else contactId
+        for url in urls:
+            await self._call('sendPhoto', {'chat_id': chatId, 'photo': url})
+
+    async def getContactList(self) -> List[Contact]:
+        pass
+
+    async def getGroupList(self) -> List[Group]:
+        pass
+
+    async def getMemberList(self, group: int) -> List[Member]:
+        pass
+
+    async def kick(self, group: int, target: int, msg: str) -> None:
+        await self._call('banChatMember', {'chat_id': group, 'user_id': target})
+
+    async def quit(self, group: int) -> None:
+        await self._call('leaveChat', {'chat_id': group})
+
+
+_ALL_PERMISSIONS = {
+    'can_send_messages': True,
+    'can_send_audios': True,
+    'can_send_documents': True,
+    'can_send_photos': True,
+    'can_send_videos': True,
+    'can_send_video_notes': True,
+    'can_send_voice_notes': True,
+    'can_send_polls': True,
+    'can_send_other_messages': True,
+    'can_add_web_page_previews': True
+}
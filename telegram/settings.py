@@ -0,0 +1,33 @@
+# 通用的运行配置见 core/settings.py，在本文件中重新赋值即可覆盖
+from core.settings import *
+
+# Bot API 令牌与地址，API_URL 可指向本地的 bench/fakebotapi.py
+BOT_TOKEN = '123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11'
+API_URL = 'https://api.telegram.org'
+
+NICKNAME = '猫猫'
+
+CMD_HEAD = '/'
+ALT_CMD_HEAD = ['.', '。', '#']
+
+BLACK_LIST = []
+
+# 长轮询：每次最多取回的更新数（上限 100）与服务端挂起等待的时长（秒）
+POLL_LIMIT = 100
+POLL_TIMEOUT = 30
+
+# Webhook 模式：设置 WEBHOOK_URL 后不再长轮询，改为在本地端口接收 Telegram 推送
+# WEBHOOK_URL 为 Telegram 可访问的公网地址，需反向代理到 WEBHOOK_HOST:WEBHOOK_PORT/WEBHOOK_PATH
+WEBHOOK_URL = None
+WEBHOOK_HOST = '127.0.0.1'
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = '/telegram'
+
+# 出站限速：Telegram 限制每个会话约 1 条/秒、全局约 30 条/秒
+SEND_RATE = 1.0
+SEND_BURST = 3
+SEND_GLOBAL_RATE = 30.0
+SEND_GLOBAL_BURST = 30
+
+# 群管理员列表（用于判断机器人与发送者的群身份）的缓存时长（秒），机器人身份变化时立即失效
+ADMIN_CACHE_TTL = 10 * 60
@@ -0,0 +1,100 @@
+"""
+Telegram Update 到统一事件字典的转换
+产出的字典与 mirai.unify 统一后的结构相同（GroupMessage / FriendMessage），
+因此可直接复用 core.stages 中的各个阶段与核心事件类
+"""
+from typing import List, Optional
+
+
+def _utf16Slice(encoded: bytes, offset: int, length: int) -> str:
+    """Telegram 的实体偏移以 UTF-16 码元计"""
+    return encoded[offset * 2:(offset + length) * 2].decode('utf-16-le')
+
+
+def displayName(user: dict) -> str:
+    name = user.get('first_name', '')
+    if user.get('last_name'):
+        name = f'{name} {user["last_name"]}'
+    return name or user.get('username', '') or str(user['id'])
+
+
+def messageChain(message: dict, botUsername: str = None) -> List[dict]:
+    chain = [{'type': 'Source', 'id': message['message_id'], 'time': message.get('date', 0)}]
+    text = message.get('text')
+    entities = message.get('entities', ())
+    if text is None:
+        text = message.get('caption')
+        entities = message.get('caption_entities', ())
+    if 'photo' in message:
+        # 取最大的一张，file_id 可直接用于发送
+        chain.append({'type': 'Image', 'imageId': message['photo'][-1]['file_id']})
+    if not text:
+        return chain
+
+    encoded = text.encode('utf-16-le')
+    pos = 0
+    parts = []
+    for entity in entities:
+        kind = entity['type']
+        if kind == 'text_mention':
+            parts.append(_utf16Slice(encoded, pos, entity['offset'] - pos))
+            parts.append({'type': 'At', 'target': entity['user']['id']})
+            pos = entity['offset'] + entity['length']
+        elif kind == 'bot_command' and entity['offset'] == 0 and botUsername:
+            # /google@yozbot -> /google
+            command = _utf16Slice(encoded, 0, entity['length'])
+            suffix = f'@{botUsername}'
+            if command.endswith(suffix):
+                parts.append(command[:-len(suffix)])
+                pos = entity['length']
+    parts.append(_utf16Slice(encoded, pos, len(encoded) // 2 - pos))
+
+    plain = ''
+    for part in parts:
+        if isinstance(part, str):
+            plain += part
+            continue
+        if plain:
+            chain.append({'type': 'Plain', 'text': plain})
+            plain = ''
+        chain.append(part)
+    if plain:
+        chain.append({'type': 'Plain', 'text': plain})
+    return chain
+
+
+def unifyUpdate(update: dict, botUsername: str = None) -> Optional[dict]:
+    """转换一条 Update，不支持的类型返回 None"""
+    message = update.get('message')
+    if message is None or 'from' not in message:
+        return None
+    user = message['from']
+    chat = message['chat']
+    chain = messageChain(message, botUsername)
+    if chat['type'] in ('group', 'supergroup'):
+        return {
+            'type': 'GroupMessage',
+            'messageChain': chain,
+            'sender': {
+                'id': user['id'],
+                'memberName': displayName(user),
+                # 消息中不带成员身份，由适配器按群管理员列表填入
+                'permission': 'Member',
+                'group': {
+                    'id': chat['id'],
+                    'name': chat.get('title', ''),
+                    'permission': 'Member'
+                }
+            }
+        }
+    if chat['type'] == 'private':
+        return {
+            'type': 'FriendMessage',
+            'messageChain': chain,
+            'sender': {
+                'id': user['id'],
+                'nickname': displayName(user),
+                'remark': ''
+            }
+        }
+    return None
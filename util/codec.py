@@ -0,0 +1,50 @@
+"""
+JSON 编解码
+安装了 orjson 或 ujson 时优先使用，否则回退到标准库 json
+"""
+import re
+
+from typing import Any, Optional, Tuple
+
+try:
+    import orjson as _impl
+    NAME = 'orjson'
+
+    def dumps(obj: Any) -> str:
+        return _impl.dumps(obj).decode('utf-8')
+except ImportError:
+    try:
+        import ujson as _impl
+        NAME = 'ujson'
+    except ImportError:
+        import json as _impl
+        NAME = 'json'
+
+    def dumps(obj: Any) -> str:
+        return _impl.dumps(obj, ensure_ascii=False)
+
+loads = _impl.loads
+
+
+__TYPE = re.compile(r'"type"\s*:\s*"(\w+)"')
+__SENDER_ID = re.compile(r'"sender"\s*:\s*\{\s*"id"\s*:\s*(\d+)')
+__CHAIN = '"messageChain"'
+
+
+def peek(frame: str) -> Tuple[Optional[str], Optional[int]]:
+    """
+    不完整解析帧，只取出事件类型与发送者 id
+    无法确定时对应位置返回 None，调用方应回退到完整解析
+    """
+    type = None
+    m = __TYPE.search(frame)
+    if m is not None:
+        # 消息链元素同样带有 type 字段，只信任出现在消息链之前的 type
+        chainAt = frame.find(__CHAIN)
+        if chainAt == -1 or m.start() < chainAt:
+            type = m.group(1)
+    senderId = None
+    m = __SENDER_ID.search(frame)
+    if m is not None:
+        senderId = int(m.group(1))
+    return type, senderId
@@ -36,6 +36,18 @@ class Crontab:
             pass
         self.uuids.remove(uuid)
 
+    def clear(self) -> None:
+        """取消全部尚未执行的任务"""
+        with self.__timeline.lock:
+            self.uuids.clear()
+            self.__tasks.clear()
+            self.__timeline.act.set()
+
+    def stop(self) -> None:
+        """取消全部任务并结束计时线程，之后不能再添加任务"""
+        self.__timeline.stopped = True
+        self.clear()
+
     def __insert(self, v: tuple):
         with self.__timeline.lock:
             self.uuids.add(v[0])
@@ -61,14 +73,20 @@ class Timeline(threading.Thread):
         self.lock = threading.RLock()
         self.crontab = crontab
         self.act = threading.Event()
+        self.stopped = False
 
     def run(self):
-        while True:
+        while not self.stopped:
             if self.tasks.size == 0:
                 self.act.wait()
-            
+                self.act.clear()
+                continue
+
             with self.lock:
                 node = self.tasks.first
+                # 可能在加锁前被 clear() 清空
+                if node is None:
+                    continue
 
                 empty = False
                 while node.value[0] not in self.crontab.uuids:
@@ -86,6 +104,8 @@ class Timeline(threading.Thread):
             if self.act.is_set():
                 self.act.clear()
                 continue
+            if self.stopped:
+                break
             with self.lock:
                 self.act.clear()
                 func = task[2]
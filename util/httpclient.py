@@ -0,0 +1,66 @@
+import asyncio
+import time
+import aiohttp
+
+from typing import Any, Callable, Dict, Optional
+
+from util import codec
+
+
+class HttpClient:
+    """
+    基于 aiohttp 的异步 HTTP 客户端
+    所有请求共享同一个保持连接的连接池，并限制同时在途的请求数
+    """
+
+    def __init__(self, baseUrl: str, poolSize: int = 32,
+                 concurrency: int = 16, timeout: float = 10.0,
+                 observer: Callable[[str, str, float, bool], None] = None) -> None:
+        """observer(类别, 接口名, 耗时, 是否成功) 会在每次请求结束后被调用"""
+        self.baseUrl: str = baseUrl.rstrip('/')
+        self.observer = observer
+        self.poolSize: int = poolSize
+        self.concurrency: int = concurrency
+        self.timeout: float = timeout
+        self.__session: Optional[aiohttp.ClientSession] = None
+        self.__slots: Optional[asyncio.Semaphore] = None
+
+    def __ensureSession(self) -> aiohttp.ClientSession:
+        # ClientSession 必须在事件循环内创建，因此延迟到第一次请求
+        if self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.poolSize,
+                keepalive_timeout=60
+            )
+            self.__session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                json_serialize=codec.dumps
+            )
+            self.__slots = asyncio.Semaphore(self.concurrency)
+        return self.__session
+
+    async def post(self, api: str, payload: Dict[str, Any]) -> dict:
+        """以 JSON 形式 POST 到 {baseUrl}/{api}，返回解析后的 JSON"""
+        return await self.__request('POST', api, json=payload)
+
+    async def get(self, api: str, params: Dict[str, Any] = None) -> dict:
+        return await self.__request('GET', api, params=params)
+
+    async def __request(self, method: str, api: str, **kwargs: Any) -> dict:
+        session = self.__ensureSession()
+        start = time.perf_counter()
+        ok = False
+        try:
+            async with self.__slots:
+                async with session.request(method, f'{self.baseUrl}/{api}', **kwargs) as resp:
+                    result = await resp.json(loads=codec.loads, content_type=None)
+            ok = True
+            return result
+        finally:
+            if self.observer is not None:
+                self.observer('http', api, time.perf_counter() - start, ok)
+
+    async def close(self) -> None:
+        if self.__session is not None and not self.__session.closed:
+            await self.__session.close()
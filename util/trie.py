@@ -115,6 +115,39 @@ class Trie(object):
             del n.parent.nodes[n.key]
             n = n.parent
 
+    def longest_prefix(self, k):
+        """Return the (prefix, value) pair of the longest key that prefixes k.
+        Only one walk along k is made, so the cost is bounded by len(k)
+        rather than by the number of keys stored.
+        Example:
+        >>> t = Trie()
+        >>> t['foo'] = 1
+        >>> t['foobar'] = 2
+        >>> t.longest_prefix('foobarbaz')
+        ('foobar', 2)
+        >>> t.longest_prefix('fooba')
+        ('foo', 1)
+        >>> t.longest_prefix('qux')
+        Traceback (most recent call last):
+            ...
+        KeyError: 'qux'
+        """
+        n = self.root
+        depth = 0
+        found = None
+        if n.value is not Node.no_value:
+            found = (0, n.value)
+        for c in k:
+            n = n.nodes.get(c)
+            if n is None:
+                break
+            depth += 1
+            if n.value is not Node.no_value:
+                found = (depth, n.value)
+        if found is None:
+            raise KeyError(k)
+        return k[:found[0]], found[1]
+
     def children(self, k):
         """Return a dict of the immediate children of the given key.
         Example: